@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""Benchmark suite for the PDF generators.
+
+Generates synthetic markdown with the same mix of blocks as
+docs/the-framework.md at several sizes and times, separately:
+
+    iter_blocks         tokenizer and inline span parser over in-memory lines
+    iter_blocks_legacy  the pre-tokenizer parser, kept here as a baseline
+    parse_markdown      parse from a file on disk
+    build_pdf           md-to-pdf.py rendering of the pre-parsed blocks
+    sola_build          SolaPDF rendering of the same blocks
+    pr_document         docs/pr-strategy/generate_pr_document.py as shipped
+
+Results are JSON with sorted keys so runs can be diffed and compared:
+
+    python scripts/bench-md-to-pdf.py --sizes 1k,100k -o bench.json
+    python scripts/bench-md-to-pdf.py --baseline bench.json --tolerance 0.10
+
+With --baseline, the exit status is 1 if any result is slower than the
+baseline by more than the tolerance.
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import re
+import sys
+import tempfile
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+MD_TO_PDF = os.path.join(SCRIPTS_DIR, "md-to-pdf.py")
+PR_DOCUMENT = os.path.join(
+    SCRIPTS_DIR, "..", "docs", "pr-strategy", "generate_pr_document.py"
+)
+
+# Bump when the corpus generator or result layout changes, so old baselines
+# are not compared against numbers that mean something else.
+SCHEMA_VERSION = 2
+
+WORDS = (
+    "agent firm workflow context review model output owner team process data "
+    "tool decision budget risk trust loop human task metric cost system"
+).split()
+
+
+def _load(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_md_to_pdf():
+    return _load("md_to_pdf", MD_TO_PDF)
+
+
+def load_pr_document():
+    return _load("generate_pr_document", PR_DOCUMENT)
+
+
+def _sentence(rng, lo=6, hi=30):
+    words = rng.choices(WORDS, k=rng.randint(lo, hi))
+    if rng.random() < 0.3:
+        i = rng.randrange(len(words))
+        words[i] = f"**{words[i]}**"
+    return " ".join(words).capitalize() + "."
+
+
+def synthetic_markdown(n_lines, seed=0):
+    """Return n_lines of markdown mixing headings, prose, lists, tables and code."""
+    rng = random.Random(seed)
+    lines = [f"# {_sentence(rng, 3, 6)}", "", f"*{_sentence(rng)}*", "", "---", ""]
+    while len(lines) < n_lines:
+        kind = rng.random()
+        if kind < 0.05:
+            lines += [f"## {_sentence(rng, 2, 6)}", ""]
+        elif kind < 0.12:
+            lines += [f"### {_sentence(rng, 2, 6)}", ""]
+        elif kind < 0.15:
+            lines += [f"#### {_sentence(rng, 2, 5)}", ""]
+        elif kind < 0.45:
+            lines += [_sentence(rng, 20, 60), ""]
+        elif kind < 0.60:
+            lines += [f"- {_sentence(rng)}" for _ in range(rng.randint(2, 6))] + [""]
+        elif kind < 0.70:
+            lines += [f"{n}. {_sentence(rng)}" for n in range(1, rng.randint(3, 7))] + [""]
+        elif kind < 0.82:
+            cols = rng.randint(2, 4)
+            lines.append("| " + " | ".join(_sentence(rng, 1, 3) for _ in range(cols)) + " |")
+            lines.append("|" + "|".join("---" for _ in range(cols)) + "|")
+            for _ in range(rng.randint(2, 8)):
+                lines.append("| " + " | ".join(_sentence(rng, 1, 12) for _ in range(cols)) + " |")
+            lines.append("")
+        elif kind < 0.90:
+            lines.append("```")
+            lines += ["    " + " ".join(rng.choices(WORDS, k=rng.randint(2, 8)))
+                      for _ in range(rng.randint(3, 15))]
+            lines += ["```", ""]
+        elif kind < 0.95:
+            lines += ["---", ""]
+        else:
+            lines += [f"*{_sentence(rng)}*", ""]
+    return lines[:n_lines]
+
+
+def legacy_iter_blocks(lines):
+    """The parser before the tokenizer stage, for before/after comparisons."""
+    in_code = False
+    code_lines = []
+    in_table = False
+    table_headers = []
+    table_rows = []
+
+    for line in lines:
+        line = line.rstrip("\n")
+
+        if line.strip().startswith("```"):
+            if in_code:
+                yield ("code", code_lines)
+                code_lines = []
+                in_code = False
+            else:
+                if in_table:
+                    yield ("table", (table_headers, table_rows))
+                    table_headers, table_rows = [], []
+                    in_table = False
+                in_code = True
+            continue
+
+        if in_code:
+            code_lines.append(line)
+            continue
+
+        if "|" in line and line.strip().startswith("|"):
+            cells = [c.strip() for c in line.strip().strip("|").split("|")]
+            if all(re.match(r'^[-:]+$', c) for c in cells):
+                continue
+            if not in_table:
+                table_headers = cells
+                in_table = True
+            else:
+                table_rows.append(cells)
+            continue
+        else:
+            if in_table:
+                yield ("table", (table_headers, table_rows))
+                table_headers, table_rows = [], []
+                in_table = False
+
+        stripped = line.strip()
+
+        if stripped == "---":
+            yield ("hr", None)
+        elif stripped.startswith("# ") and not stripped.startswith("## "):
+            yield ("h1", stripped[2:].strip())
+        elif stripped.startswith("## "):
+            yield ("h2", stripped[3:].strip())
+        elif stripped.startswith("### "):
+            yield ("h3", stripped[4:].strip())
+        elif stripped.startswith("#### "):
+            yield ("h4", stripped[5:].strip())
+        elif re.match(r'^(\d+)\.\s+(.+)', stripped):
+            m = re.match(r'^(\d+)\.\s+(.+)', stripped)
+            yield ("numbered", (m.group(1), m.group(2)))
+        elif stripped.startswith("- ") or stripped.startswith("* "):
+            yield ("bullet", stripped[2:])
+        elif stripped == "":
+            yield ("empty", None)
+        elif stripped.startswith("*") and stripped.endswith("*") and not stripped.startswith("**"):
+            yield ("italic_para", stripped[1:-1])
+        else:
+            yield ("para", stripped)
+
+    if in_table:
+        yield ("table", (table_headers, table_rows))
+    if in_code:
+        yield ("code", code_lines)
+
+
+def as_current_blocks(md, blocks):
+    """Legacy blocks in the shape iter_blocks yields today: text parsed into
+    spans, and each table streamed as a header, its rows and an end marker."""
+    for btype, data in blocks:
+        if btype in md.HEADING_LEVELS:
+            yield (btype, md.span_text(md.parse_spans(data)))
+        elif btype in ("para", "italic_para", "bullet"):
+            yield (btype, md.parse_spans(data.lstrip()))
+        elif btype == "numbered":
+            yield (btype, (data[0], md.parse_spans(data[1])))
+        elif btype == "table":
+            headers, rows = data
+            yield ("table_header", [md.parse_spans(c) for c in headers])
+            for row in rows:
+                yield ("table_row", [md.parse_spans(c) for c in row])
+            yield ("table_end", None)
+        else:
+            yield (btype, data)
+
+
+def core_text(md, text):
+    return text.encode(md.CORE_ENCODING, "replace").decode(md.CORE_ENCODING)
+
+
+def render_sola(md, pr, blocks, output_path):
+    """Replay markdown blocks through SolaPDF's own building blocks.
+
+    SolaPDF sets plain text in Helvetica, so spans are flattened and
+    characters Helvetica has no glyph for become "?" (compile_plan() would
+    reject them).
+    """
+    pdf = pr.SolaPDF()
+    pdf.alias_nb_pages()
+    pdf.add_page()
+    for btype, data in blocks:
+        if btype in ("para", "italic_para", "bullet"):
+            data = md.span_text(data)
+        if isinstance(data, str):
+            data = core_text(md, data)
+        if btype == "h1":
+            pdf.section_title(data)
+        elif btype == "h2":
+            pdf.heading(data)
+        elif btype in ("h3", "h4"):
+            pdf.subheading(data)
+        elif btype == "para":
+            pdf.body(data)
+        elif btype == "italic_para":
+            pdf.body_italic(data)
+        elif btype == "bullet":
+            pdf.simple_bullet(data)
+        elif btype == "numbered":
+            pdf.bullet(f"{data[0]}.", core_text(md, md.span_text(data[1])))
+        elif btype == "code":
+            pdf.body(core_text(md, "\n".join(data)))
+        elif btype in ("table_header", "table_row"):
+            cells = [core_text(md, md.span_text(c))[:40] for c in data[:3]] + ["", ""]
+            pdf.table_row(cells[0], cells[1], cells[2] or None, header=btype == "table_header")
+    pdf.output(output_path)
+
+
+def best_time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def run_suite(sizes, repeat, build_max_lines):
+    md = load_md_to_pdf()
+    pr = load_pr_document()
+    results = []
+
+    def record(name, lines, fn, runs=repeat):
+        seconds = best_time(fn, runs)
+        entry = {"name": name, "lines": lines, "seconds": round(seconds, 6), "runs": runs}
+        if lines:
+            entry["lines_per_second"] = round(lines / seconds)
+        results.append(entry)
+        print(f"  {name:<20}{lines:>10,} lines {seconds:>10.3f}s", file=sys.stderr)
+
+    def skip(name, lines, reason):
+        results.append({"name": name, "lines": lines, "skipped": reason})
+        print(f"  {name:<20}{lines:>10,} lines    skipped ({reason})", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "out.pdf")
+        for n_lines in sizes:
+            lines = [line + "\n" for line in synthetic_markdown(n_lines)]
+            src = os.path.join(tmp, f"corpus-{n_lines}.md")
+            with open(src, "w") as f:
+                f.writelines(lines)
+
+            blocks = list(md.iter_blocks(lines))
+            if list(as_current_blocks(md, legacy_iter_blocks(lines))) != blocks:
+                raise SystemExit("parsers disagree on the synthetic corpus")
+
+            record("iter_blocks", n_lines, lambda: list(md.iter_blocks(lines)))
+            record("iter_blocks_legacy", n_lines, lambda: list(legacy_iter_blocks(lines)))
+            record("parse_markdown", n_lines, lambda: md.parse_markdown(src))
+
+            if n_lines > build_max_lines:
+                reason = f"over --build-max-lines {build_max_lines}"
+                skip("build_pdf", n_lines, reason)
+                skip("sola_build", n_lines, reason)
+                continue
+            # Builds are slow and steady; one run is enough past small sizes
+            runs = repeat if n_lines <= 10_000 else 1
+            record("build_pdf", n_lines, lambda: md.build_pdf(blocks, out), runs)
+            record("sola_build", n_lines, lambda: render_sola(md, pr, blocks, out), runs)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            seconds = best_time(lambda: pr.build_pdf(out), repeat)
+        results.append({"name": "pr_document", "lines": 0, "seconds": round(seconds, 6),
+                        "runs": repeat})
+        print(f"  {'pr_document':<20}{'':>16} {seconds:>10.3f}s", file=sys.stderr)
+
+    return {
+        "schema": SCHEMA_VERSION,
+        "python": platform.python_version(),
+        "fpdf": md.fpdf.__version__,
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Print slowdowns against baseline; return how many exceed tolerance."""
+    if baseline.get("schema") != report["schema"]:
+        print("baseline schema differs; not comparing", file=sys.stderr)
+        return 0
+    before = {(r["name"], r["lines"]): r for r in baseline["results"] if "seconds" in r}
+    regressions = 0
+    for result in report["results"]:
+        old = before.get((result["name"], result["lines"]))
+        if old is None or "seconds" not in result:
+            continue
+        ratio = result["seconds"] / old["seconds"] if old["seconds"] else 1.0
+        flag = "SLOWER" if ratio > 1 + tolerance else "ok"
+        regressions += flag == "SLOWER"
+        print(f"  {flag:<7}{result['name']:<20}{result['lines']:>10,} lines  {ratio:>6.2f}x",
+              file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1k,100k,1m",
+                        help="comma-separated corpus sizes in lines (default: 1k,100k,1m)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per timing; best is kept")
+    parser.add_argument("--build-max-lines", type=parse_size, default=100_000,
+                        help="skip PDF builds above this many lines (default: 100k)")
+    parser.add_argument("-o", "--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="JSON report from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed slowdown against --baseline (default: 0.10)")
+    args = parser.parse_args()
+
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+    report = run_suite(sizes, args.repeat, args.build_max_lines)
+
+    text = json.dumps(report, indent=2, sort_keys=True) + "\n"
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
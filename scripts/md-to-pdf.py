@@ -1,16 +1,111 @@
 #!/usr/bin/env python3
-"""Convert the-framework.md to a clean, well-formatted PDF using fpdf2."""
+"""Convert the-framework.md to a clean, well-formatted PDF using fpdf2.
 
+With no arguments, converts docs/the-framework.md to docs/the-framework.pdf.
+Given files, directories or globs, converts every matching markdown file to a
+PDF next to it, one document per worker process:
+
+    python scripts/md-to-pdf.py docs docs/plans -j 8
+    python scripts/md-to-pdf.py "docs/plans/2026-02-*.md"
+
+To proof part of one document, --section and --pages render just those
+blocks to <name>.proof.pdf:
+
+    python scripts/md-to-pdf.py docs/the-framework.md --section Antifragility
+    python scripts/md-to-pdf.py docs/the-framework.md --pages 7-9
+
+--html writes a lightweight HTML preview, <name>.preview.html, in milliseconds:
+
+    python scripts/md-to-pdf.py docs/the-framework.md --html
+
+--parallel renders one long document in page ranges across -j workers:
+
+    python scripts/md-to-pdf.py docs/report.md --parallel -j 8
+
+An ![alt](path) line embeds an image, relative to the markdown file: PNG,
+JPEG and the like, SVG (needs rsvg-convert) or a PlantUML source (needs
+plantuml). One that points at a URL stays a paragraph. MD_TO_PDF_IMAGE_DPI (default 150) caps their resolution.
+
+With SOURCE_DATE_EPOCH set the output is byte-for-byte reproducible;
+--check-reproducible builds a document twice and compares the hashes.
+"""
+
+import argparse
+import glob
+import hashlib
+import html
+import io
+import json
+import marshal
+import math
 import re
 import os
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import quote, urlsplit
+import fpdf
+from fontTools import ttLib
+from PIL import Image
 from fpdf import FPDF
+from fpdf.drawing import DeviceRGB
+from fpdf.enums import Align, FontDescriptorFlags, TextEmphasis, XPos, YPos
+from fpdf.fonts import PDFFontDescriptor, SubsetMap, TTFFont
+from fpdf.line_break import Fragment, MultiLineBreak, TextLine
+from fpdf.outline import build_outline_objs
 
 INPUT = os.path.join(os.path.dirname(__file__), "..", "docs", "the-framework.md")
 OUTPUT = os.path.join(os.path.dirname(__file__), "..", "docs", "the-framework.pdf")
 
+# -- Build cache --
+# One small key file per output PDF. The key covers the markdown, the font file
+# and the renderer itself (this script + fpdf2), so any of them changing forces
+# a rebuild while unchanged documents are left untouched on disk.
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CACHE_DIR = os.path.join(REPO_ROOT, ".cache", "md-to-pdf")
+
 # -- Fonts --
-FONT_PATH = "/Library/Fonts/Arial Unicode.ttf"
+# MD_TO_PDF_FONT overrides the search; otherwise the first existing candidate
+# wins, so the same script runs on a Mac and on the Linux CI box.
+FONT_CANDIDATES = (
+    "/Library/Fonts/Arial Unicode.ttf",
+    "/System/Library/Fonts/Supplemental/Arial Unicode.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/TTF/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/noto/NotoSans-Regular.ttf",
+)
 FONT_FAMILY = "ArialUnicode"
+FONT_CACHE_DIR = os.path.join(CACHE_DIR, "fonts")
+# Runs the core font can encode are set in Helvetica, which is never
+# embedded; the TTF above is only registered and embedded once some run needs
+# a glyph outside windows-1252. MD_TO_PDF_CORE_FONTS=0 embeds it for all text.
+CORE_FAMILY = "helvetica"
+CODE_FAMILY = "courier"
+CORE_ENCODING = "windows-1252"
+USE_CORE_FONTS = os.environ.get("MD_TO_PDF_CORE_FONTS", "1") != "0"
+
+
+def resolve_font_path():
+    override = os.environ.get("MD_TO_PDF_FONT")
+    if override:
+        return override
+    for candidate in FONT_CANDIDATES:
+        if os.path.exists(candidate):
+            return candidate
+    # Nothing installed: keep the historical path so the error names it
+    return FONT_CANDIDATES[0]
+
+
+FONT_PATH = resolve_font_path()
 
 # -- Colours --
 BLACK = (30, 30, 30)
@@ -20,33 +115,593 @@ LIGHT_GREY = (200, 200, 200)
 RULE_GREY = (220, 220, 220)
 TABLE_HEADER_BG = (242, 242, 242)
 CODE_BG = (246, 246, 246)
+LINK_BLUE = (30, 80, 160)
+
+# -- Measurement --
+# Bullets, number prefixes and short table cells are measured over and over
+# in the same font; widths are kept in a bounded LRU shared by every
+# FrameworkPDF in the process, so a long-lived --watch process stays warm.
+WIDTH_CACHE_SIZE = 4096
+_width_cache = OrderedDict()
+
+# -- Watch mode --
+WATCH_INTERVAL = 0.2   # seconds between mtime polls
+WATCH_DEBOUNCE = 0.15  # quiet period that ends a burst of saves
+
+# -- Outline --
+# Headings become PDF bookmarks at these outline levels; with --toc the ones up
+# to TOC_MAX_LEVEL are also listed on a contents page reserved before the
+# first h2 and filled in once the whole document has been laid out.
+HEADING_LEVELS = {"h1": 0, "h2": 1, "h3": 2, "h4": 3}
+TOC_MAX_LEVEL = 2
+TOC_LINE_H = 7
+TOC_TITLE_H = 20
+
+# -- Tables --
+TABLE_FONT_SIZE = 8.5
+TABLE_LINE_H = 5.5
+# Rows held back to size and balance the columns of a streamed table; later
+# rows rarely change the answer and are drawn as they arrive
+TABLE_LAYOUT_SAMPLE = 60
+# Text is split into words and single spaces to count its lines; fpdf2
+# compares widths with this tolerance when it breaks them
+SPACE_SPLIT_RE = re.compile(r"( +)")
+FLOAT_TOLERANCE = 1e-9
+
+# -- Parallel rendering --
+# --parallel lays a long document out once without setting any text, cuts it
+# at page breaks that fall between blocks and renders the pieces in worker
+# processes (see render_parallel()). A piece shorter than this many pages
+# isn't worth a worker.
+PARALLEL_MIN_PAGES = 40
+
+# -- Images --
+# An image is printed at its own size (IMAGE_SOURCE_DPI when the file
+# doesn't record one, CSS pixels for SVG), shrunk to the text width if wider,
+# and embedded with at most MD_TO_PDF_IMAGE_DPI pixels per inch of paper.
+# Rasters are downscaled and recompressed, SVG is rasterized with
+# rsvg-convert and PlantUML sources are drawn with plantuml first; the results
+# are kept under IMAGE_CACHE_DIR by source hash and DPI, so a repeat build only
+# reads them, and an image used several times, under any name, is embedded
+# once.
+IMAGE_CACHE_DIR = os.path.join(CACHE_DIR, "images")
+IMAGE_DPI = int(os.environ.get("MD_TO_PDF_IMAGE_DPI", "150"))
+IMAGE_SOURCE_DPI = 96
+IMAGE_JPEG_QUALITY = 85
+# Images with more colours than this and no transparency are stored as JPEG
+IMAGE_PALETTE_COLORS = 256
+SVG_RASTERIZER = "rsvg-convert"
+PLANTUML = "plantuml"
+PLANTUML_EXTS = (".puml", ".plantuml", ".pu")
+SVG_ROOT_RE = re.compile(rb"<svg\b[^>]*>")
+SVG_ATTR_RE = re.compile(rb'\s(width|height|viewBox)\s*=\s*["\']([^"\']*)["\']')
+# An image that doesn't fit on the rest of the page moves to the next one;
+# one taller than a page is cut across pages instead, starting on this one
+# if at least this much of it is left
+IMAGE_MIN_SLICE = 40
+# Height of the running head on every page after the first
+RUNNING_HEAD_H = 10
+
+# -- Reproducible builds --
+# fpdf2 stamps /CreationDate with the current time and derives the file /ID
+# from it, so those are the only bytes that differ between two builds of the
+# same input. SOURCE_DATE_EPOCH (https://reproducible-builds.org/) pins both.
+REPRODUCIBLE_SEEDS = ("1", "2")  # PYTHONHASHSEED of the two --check-reproducible builds
+
+
+def source_date():
+    """SOURCE_DATE_EPOCH as a UTC datetime, or None when it is not set."""
+    epoch = os.environ.get("SOURCE_DATE_EPOCH", "").strip()
+    if not epoch:
+        return None
+    return datetime.fromtimestamp(int(epoch), timezone.utc)
+
+
+def coverage_bits(codepoints):
+    """Pack codepoints into a bitset: bit cp & 7 of byte cp >> 3."""
+    codepoints = list(codepoints)
+    bits = bytearray((max(codepoints, default=0) >> 3) + 1)
+    for cp in codepoints:
+        bits[cp >> 3] |= 1 << (cp & 7)
+    return bytes(bits)
+
+
+def covers(bits, text):
+    """True when every character of text has its bit set in bits."""
+    limit = len(bits) << 3
+    for ch in set(text):
+        cp = ord(ch)
+        if cp >= limit or not bits[cp >> 3] >> (cp & 7) & 1:
+            return False
+    return True
+
+
+def _core_codepoints():
+    for b in range(256):
+        try:
+            yield ord(bytes((b,)).decode(CORE_ENCODING))
+        except UnicodeDecodeError:
+            pass
+
+
+CORE_COVERAGE = coverage_bits(_core_codepoints())
+# The fallback TTF's coverage, from the cmap in its metrics, by font file
+_font_coverage = {}
+
+
+def font_coverage(font):
+    """Coverage bitset of a registered TTFFont, built once per font file."""
+    key = str(font.ttffile)
+    if key not in _font_coverage:
+        _font_coverage[key] = coverage_bits(font.cmap)
+    return _font_coverage[key]
+
+
+# Every cache file (build keys, page indexes, IR, font metrics, images) is
+# written to a per-process temporary name and renamed into place, so
+# concurrent builds and interrupted ones never leave a partial file behind.
+@contextmanager
+def _atomic_write(target, mode="wb"):
+    """Open a temporary file that replaces target when the block completes,
+    and is removed instead if it raises."""
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, mode) as f:
+            yield f
+        os.replace(tmp, target)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _store_cached(target, data):
+    with _atomic_write(target) as f:
+        f.write(data)
+
+
+# Parsed font metrics, shared by every style and every document in this process
+# and persisted under FONT_CACHE_DIR so later runs skip parsing the TTF.
+_font_metrics = {}
+# _font_from_metrics() sets TTFFont's private attributes by hand, so it is only
+# used with the fpdf2 releases it was checked against; any other version
+# parses the TTF with plain add_font().
+FONT_METRICS_FPDF_VERSIONS = ("2.8.9",)
+
+
+def _font_metrics_file(font_path):
+    stat = os.stat(font_path)
+    ident = f"{os.path.abspath(font_path)}|{stat.st_size}|{stat.st_mtime_ns}|{fpdf.__version__}"
+    return os.path.join(FONT_CACHE_DIR, hashlib.sha1(ident.encode()).hexdigest() + ".metrics")
+
+
+def _extract_font_metrics(font):
+    """Pull the parsed, style-independent fields out of a TTFFont, or return
+    None for fonts that need more than plain metrics (colour, CFF, WOFF,
+    synthesized .notdef)."""
+    if font.color_font or font.is_cff or font.is_compressed:
+        return None
+    fresh = ttLib.TTFont(font.ttffile, lazy=True)
+    if ".notdef" not in fresh.getGlyphOrder():
+        return None
+    desc = font.desc
+    return {
+        "scale": font.scale,
+        "desc": (desc.ascent, desc.descent, desc.cap_height, desc.flags.value,
+                 desc.font_b_box, desc.italic_angle, desc.stem_v, desc.missing_width),
+        "cw": dict(font.cw),
+        "cmap": dict(font.cmap),
+        "glyph_ids": dict(font.glyph_ids),
+        "is_symbol": font.is_symbol,
+        "name": font.name,
+        "lines": (font.up, font.ut, font.sp, font.ss),
+    }
+
+
+def _font_from_metrics(pdf, font_path, fontkey, style, metrics):
+    """Build a TTFFont from cached metrics. Each instance still opens its own
+    lazy TTFont, because fpdf2 subsets that object in place on output."""
+    font = TTFFont.__new__(TTFFont)
+    font.i = len(pdf.fonts) + 1
+    font.type = "TTF"
+    font.ttffile = Path(font_path)
+    font.is_compressed = False
+    font._hbfont = None
+    font.fontkey = fontkey
+    font.biggest_size_pt = 0
+    font.collection_font_number = 0
+    font.ttfont = ttLib.TTFont(font_path, recalcTimestamp=False, fontNumber=0, lazy=True)
+    font.is_cff = False
+    font.is_cid_keyed = False
+    font.is_symbol = metrics["is_symbol"]
+    font.cff_ros = None
+    font.scale = metrics["scale"]
+    ascent, descent, cap_height, flags, bbox, italic_angle, stem_v, missing_w = metrics["desc"]
+    font.desc = PDFFontDescriptor(
+        ascent=ascent, descent=descent, cap_height=cap_height,
+        flags=FontDescriptorFlags(flags), font_b_box=bbox,
+        italic_angle=italic_angle, stem_v=stem_v, missing_width=missing_w,
+    )
+    font.cw = defaultdict(lambda: missing_w, metrics["cw"])
+    font.cmap = metrics["cmap"]
+    font.glyph_ids = metrics["glyph_ids"]
+    font.missing_glyphs = []
+    font.name = metrics["name"]
+    font.up, font.ut, font.sp, font.ss = metrics["lines"]
+    font.emphasis = TextEmphasis.coerce(style)
+    font.subset = SubsetMap(font)
+    font.palette_index = 0
+    font.color_font = None
+    return font
+
+
+def _load_font_metrics(font_path):
+    key = _font_metrics_file(font_path)
+    if key not in _font_metrics:
+        try:
+            with open(key, "rb") as f:
+                _font_metrics[key] = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return key, None
+    return key, _font_metrics[key]
+
+
+def register_font(pdf, family, font_path, styles=("", "B", "I", "BI")):
+    """add_font() for every style, parsing the TTF at most once.
+
+    The first style goes through fpdf2 when no metrics are cached yet; its
+    metrics are then saved and reused for the remaining styles and runs.
+    Anything unexpected falls back to plain add_font(), and so does an fpdf2
+    not in FONT_METRICS_FPDF_VERSIONS.
+    """
+    if fpdf.__version__ not in FONT_METRICS_FPDF_VERSIONS:
+        for style in styles:
+            pdf.add_font(family, style, font_path)
+        return
+    key, metrics = _load_font_metrics(font_path)
+    for style in styles:
+        fontkey = f"{family.lower()}{style}"
+        if metrics is not None:
+            try:
+                pdf.fonts[fontkey] = _font_from_metrics(pdf, font_path, fontkey, style, metrics)
+                continue
+            except Exception:
+                metrics = None
+        pdf.add_font(family, style, font_path)
+        if key not in _font_metrics:
+            metrics = _extract_font_metrics(pdf.fonts[fontkey])
+            _font_metrics[key] = metrics
+            if metrics is not None:
+                _store_cached(key, marshal.dumps(metrics))
+
+
+# Printed sizes, by source file, and the cached files to embed, by source
+# hash and pixel width; both kept for the life of the process
+_image_sizes = {}
+_image_files = {}
+
+
+def _run_tool(command, path, **kwargs):
+    """Run an external converter for the image at path and return its stdout."""
+    try:
+        return subprocess.run(command, check=True, capture_output=True, **kwargs).stdout
+    except FileNotFoundError:
+        raise RuntimeError(f"{path}: rendering it needs {command[0]}, which isn't on PATH") from None
+    except subprocess.CalledProcessError as exc:
+        message = exc.stderr.decode(errors="replace").strip()
+        raise RuntimeError(f"{path}: {command[0]} failed: {message}") from None
+
+
+def _plantuml_svg(path):
+    """The SVG plantuml draws for the diagram source at path, cached by its hash."""
+    target = os.path.join(IMAGE_CACHE_DIR, _file_digest(path)[:32] + ".svg")
+    if not os.path.exists(target):
+        with open(path, "rb") as f:
+            _store_cached(target, _run_tool([PLANTUML, "-tsvg", "-pipe"], path, stdin=f))
+    return target
+
+
+def _svg_size(path):
+    """(width, height) of an SVG in CSS pixels."""
+    with open(path, "rb") as f:
+        m = SVG_ROOT_RE.search(f.read(1 << 16))
+    attrs = dict(SVG_ATTR_RE.findall(m.group())) if m else {}
+    try:
+        return float(attrs[b"width"].removesuffix(b"px")), float(attrs[b"height"].removesuffix(b"px"))
+    except (KeyError, ValueError):
+        pass
+    try:
+        _, _, width, height = (float(v) for v in attrs[b"viewBox"].replace(b",", b" ").split())
+        return width, height
+    except (KeyError, ValueError):
+        raise ValueError(f"{path}: no width and height or viewBox on its <svg>") from None
+
+
+def _image_source(path):
+    """What to read for the image at path: the SVG for a PlantUML source,
+    else path itself."""
+    if path.lower().endswith(PLANTUML_EXTS):
+        return _plantuml_svg(path)
+    return path
+
+
+def image_size(path, max_w):
+    """(width, height) in mm the image at path is printed at: its own size,
+    shrunk to max_w if wider."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, max_w)
+    if memo_key not in _image_sizes:
+        source = _image_source(path)
+        if source.lower().endswith(".svg"):
+            px_w, px_h = _svg_size(source)
+            dpi = IMAGE_SOURCE_DPI
+        else:
+            with Image.open(source) as im:
+                (px_w, px_h), dpi = im.size, im.info.get("dpi", (0, 0))[0]
+            if not dpi or dpi < 1:
+                dpi = IMAGE_SOURCE_DPI
+        width = min(max_w, px_w / dpi * 25.4)
+        _image_sizes[memo_key] = (width, width * px_h / px_w)
+    return _image_sizes[memo_key]
+
+
+def _encode_raster(im, drawing=False):
+    """Encode im as a palette PNG when it has few colours, a PNG when it is
+    transparent, else a JPEG. A drawing (a rasterized SVG: flat colours and
+    anti-aliased edges) is always a palette PNG, which keeps its text sharp
+    at half the size of a JPEG. Returns (bytes, extension)."""
+    if im.mode not in ("RGB", "RGBA", "L", "LA"):
+        alpha = "A" in im.getbands() or "transparency" in im.info
+        im = im.convert("RGBA" if alpha else "RGB")
+    if im.mode in ("RGBA", "LA") and im.getchannel("A").getextrema()[0] == 255:
+        im = im.convert(im.mode[:-1])
+    out = io.BytesIO()
+    colors = im.getcolors(IMAGE_PALETTE_COLORS)
+    if drawing and colors is None:
+        colors = IMAGE_PALETTE_COLORS
+    elif colors is not None:
+        colors = len(colors)
+    if colors is not None and im.mode == "RGB":
+        im = im.quantize(colors)
+    if colors is not None or im.mode in ("RGBA", "LA"):
+        im.save(out, "PNG", optimize=True)
+        return out.getvalue(), ".png"
+    im.save(out, "JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+    return out.getvalue(), ".jpg"
+
+
+def image_file(path, width, dpi=IMAGE_DPI):
+    """The file to embed for the image at path printed width mm wide: a
+    copy with at most dpi pixels per inch, built once and then read from
+    IMAGE_CACHE_DIR."""
+    source = _image_source(path)
+    px = max(1, round(width / 25.4 * dpi))
+    stem = os.path.join(IMAGE_CACHE_DIR, f"{_file_digest(source)[:32]}-{dpi}dpi-{px}px")
+    if stem in _image_files:
+        return _image_files[stem]
+    for ext in (".png", ".jpg"):
+        if os.path.exists(stem + ext):
+            _image_files[stem] = stem + ext
+            return stem + ext
+
+    if source.lower().endswith(".svg"):
+        png = _run_tool([SVG_RASTERIZER, "-w", str(px), "-b", "white", "-f", "png", source], path)
+        data, ext = _encode_raster(Image.open(io.BytesIO(png)), drawing=True)
+    else:
+        with Image.open(source) as im:
+            original_ext = {"PNG": ".png", "JPEG": ".jpg"}.get(im.format)
+            resized = im.width > px
+            if resized:
+                im = im.resize((px, max(1, round(im.height * px / im.width))), Image.LANCZOS)
+            data, ext = _encode_raster(im)
+        # An image that is already small enough and well compressed is kept
+        if not resized and original_ext and os.path.getsize(source) <= len(data):
+            with open(source, "rb") as f:
+                data, ext = f.read(), original_ext
+    _store_cached(stem + ext, data)
+    _image_files[stem] = stem + ext
+    return stem + ext
 
 
 class FrameworkPDF(FPDF):
-    def __init__(self):
+    def __init__(self, optimize=False, layout_only=False, base_dir=None):
         super().__init__(format="A4")
+        date = source_date()
+        if date is not None:
+            self.set_creation_date(date)
         self.set_auto_page_break(auto=True, margin=25)
         self.set_margins(25, 25, 25)
         self.alias_nb_pages()
-
-        # Register Unicode font
-        self.add_font(FONT_FAMILY, "", FONT_PATH)
-        self.add_font(FONT_FAMILY, "B", FONT_PATH)
-        self.add_font(FONT_FAMILY, "I", FONT_PATH)
-        self.add_font(FONT_FAMILY, "BI", FONT_PATH)
+        self.core_fonts_encoding = CORE_ENCODING
+        self._width_cache = _width_cache
+        self.width_cache_hits = 0
+        self.width_cache_misses = 0
+
+        # FONT_FAMILY is a logical font: set_font() records the style and
+        # size, and each text run is set in the first family of this chain
+        # whose coverage includes all of its characters (the last one is the
+        # fallback regardless). The TTF is registered on first use; characters
+        # even it has no glyph for are collected in missing_chars and reported
+        # when the PDF is written.
+        self._run_font = None
+        self._font_chain = [(CORE_FAMILY, CORE_COVERAGE)] if USE_CORE_FONTS else []
+        self._font_chain.append((FONT_FAMILY.lower(), None))
+        # `code` spans try the monospaced core font first
+        self._code_chain = [(CODE_FAMILY, CORE_COVERAGE)] if USE_CORE_FONTS else []
+        self._code_chain.append(self._font_chain[-1])
+        self._run_families = {family for family, _ in self._font_chain}
+        self._link_color = DeviceRGB(*(c / 255 for c in LINK_BLUE))
+        self._fallback_registered = False
+        self._fallback_coverage = None
+        self.missing_chars = set()
+        self.missing_run = None   # the first run with a missing character
+        # Time spent registering the TTF, on whichever run first needs it
+        self.font_load_seconds = 0.0
+        self.font_runs = {family: 0 for family, _ in self._font_chain + self._code_chain}
+        self.optimize = optimize
+        self._first_title = True
+        self._table_headers = None
+        # Image paths are relative to the markdown file, which lives here
+        self.base_dir = base_dir or ""
+
+        # A layout-only document counts the lines of text blocks from cached
+        # word widths and moves down the page instead of setting them, so
+        # its page breaks, outline and page count are the real ones at a
+        # fraction of the cost. A piece of a parallel render numbers its
+        # pages from page_offset + 1 out of total_pages.
+        self.layout_only = layout_only
+        # Word widths for _count_lines(), so only ever filled in a
+        # layout-only document
+        self._line_widths = {}
+        self.page_offset = 0
+        self.total_pages = None
+        # Everything that puts ink on a page bumps ink; footer() records it
+        # for each page, so a block that drew nothing before its first page
+        # break can be told apart from one that did.
+        self.ink = 0
+        self.page_ink = []
+
+    def _register_fallback(self):
+        if not self._fallback_registered:
+            start = time.perf_counter()
+            register_font(self, FONT_FAMILY, FONT_PATH)
+            self._fallback_coverage = font_coverage(self.fonts[FONT_FAMILY.lower()])
+            self.font_load_seconds += time.perf_counter() - start
+            self._fallback_registered = True
+            if self.optimize:
+                # Every style comes from the same file: with one shared
+                # subset they embed byte-identical fonts, which
+                # optimize_pdf() then merges into one.
+                family = FONT_FAMILY.lower()
+                subset = self.fonts[family].subset
+                for style in ("B", "I", "BI"):
+                    self.fonts[family + style].subset = subset
+
+    def set_font(self, family=None, style="", size=0):
+        if family and family.lower() == FONT_FAMILY.lower():
+            self._run_font = (style, size)
+            # Keep the current family until a run picks one
+            if self.font_family in self._run_families:
+                family = self.font_family
+            else:
+                family = self._font_chain[0][0]
+        elif not family or family.lower() not in self._run_families:
+            self._run_font = None
+        if family and family.lower() == FONT_FAMILY.lower():
+            self._register_fallback()
+        super().set_font(family, style, size)
+
+    def _run_family(self, text, chain):
+        """The first family in chain that covers text, counted in font_runs."""
+        for family, bits in chain:
+            # Every font in the chain covers ASCII, so most runs stop here
+            if bits is None or text.isascii() or covers(bits, text):
+                break
+        if bits is None:
+            self._register_fallback()
+            if not text.isascii() and not covers(self._fallback_coverage, text):
+                if self.missing_run is None:
+                    self.missing_run = text
+                self.missing_chars.update(
+                    ch for ch in text if not covers(self._fallback_coverage, ch))
+        self.font_runs[family] += 1
+        return family
+
+    def _select_font(self, text):
+        """Switch the logical font to the first family that covers text."""
+        if self._run_font is None or not text:
+            return
+        family = self._run_family(text, self._font_chain)
+        if family != self.font_family:
+            style, size = self._run_font
+            super().set_font(family, style, size)
+
+    def output(self, name="", *args, **kwargs):
+        if self.missing_chars:
+            # Reported here, once per document, instead of by fpdf2
+            for font in self.fonts.values():
+                if isinstance(font, TTFFont):
+                    font.missing_glyphs.clear()
+            chars = sorted(self.missing_chars)
+            shown = ", ".join(f"{ch!r} (U+{ord(ch):04X})" for ch in chars[:10])
+            if len(chars) > 10:
+                shown += f" and {len(chars) - 10} more"
+            label = name if isinstance(name, (str, os.PathLike)) and name else "PDF"
+            run = self.missing_run if len(self.missing_run) <= 40 else self.missing_run[:37] + "..."
+            print(f"warning: {label}: {os.path.basename(FONT_PATH)} has no glyph for {shown}, "
+                  f"which print as blank boxes (first in {run!r})", file=sys.stderr)
+        return super().output(name, *args, **kwargs)
+
+    def cell(self, w=None, h=None, text="", *args, **kwargs):
+        self._select_font(text)
+        return super().cell(w, h, text, *args, **kwargs)
+
+    def multi_cell(self, w, h=None, text="", *args, **kwargs):
+        self._select_font(text)
+        if self.layout_only and w == 0 and text and not args and not kwargs:
+            # The headings' multi_cell(0, h, text): count its lines instead,
+            # and end up where it would
+            x = self.x
+            w = self.w - self.r_margin - x
+            lines = self._count_lines([(text, "", None)], w, self.font_size_pt, self.font_style)
+            self._print_lines([None] * lines, h)
+            self.x = x + w
+            return None
+        return super().multi_cell(w, h, text, *args, **kwargs)
+
+    def write(self, h=None, text="", *args, **kwargs):
+        self._select_font(text)
+        return super().write(h, text, *args, **kwargs)
+
+    def get_string_width(self, s, normalized=False, markdown=False):
+        """get_string_width with a bounded LRU keyed on font and text."""
+        self._select_font(s)
+        key = (
+            self.font_family, self.font_style, self.font_size_pt,
+            self.font_stretching, self.char_spacing, s, normalized, markdown,
+        )
+        cache = self._width_cache
+        width = cache.get(key)
+        if width is not None:
+            cache.move_to_end(key)
+            self.width_cache_hits += 1
+            return width
+        self.width_cache_misses += 1
+        width = cache[key] = super().get_string_width(s, normalized, markdown)
+        if len(cache) > WIDTH_CACHE_SIZE:
+            cache.popitem(last=False)
+        return width
 
     def header(self):
-        if self.page_no() > 1:
+        if self.page_no() + self.page_offset > 1:
             self.set_font(FONT_FAMILY, "I", 8)
             self.set_text_color(*MID_GREY)
             self.cell(0, 8, "The Agent-Native Firm", align="L")
-            self.ln(10)
+            self.ln(RUNNING_HEAD_H)
 
     def footer(self):
+        self.page_ink.append(self.ink)
         self.set_y(-20)
         self.set_font(FONT_FAMILY, "", 8)
         self.set_text_color(*MID_GREY)
-        self.cell(0, 10, f"{self.page_no()}/{{nb}}", align="C")
+        total = self.total_pages or "{nb}"
+        self.cell(0, 10, f"{self.page_no() + self.page_offset}/{total}", align="C")
+
+    def rect(self, *args, **kwargs):
+        self.ink += 1
+        return super().rect(*args, **kwargs)
+
+    def line(self, *args, **kwargs):
+        self.ink += 1
+        return super().line(*args, **kwargs)
+
+    def _render_styled_text_line(self, *args, **kwargs):
+        # cell(), multi_cell() and _print_lines() all set text through here,
+        # after any page break the line causes
+        page_break = super()._render_styled_text_line(*args, **kwargs)
+        self.ink += 1
+        return page_break
 
     def h_rule(self):
         self.ln(4)
@@ -55,9 +710,136 @@ class FrameworkPDF(FPDF):
         self.line(25, y, self.w - 25, y)
         self.ln(6)
 
+    def bookmark(self, text, level, line_h):
+        """Add text to the outline at the current position. Call it after
+        set_font(): if the heading's first line of height line_h won't fit,
+        the page break multi_cell would take happens first, so the bookmark
+        lands on the page the heading is printed on."""
+        if self.will_page_break(line_h):
+            self.add_page()
+        self.start_section(text, level, strict=False)
+
+    def reserve_toc(self, entries):
+        """Start a contents page here and reserve enough pages for entries
+        lines, so page numbers after it are final when they are rendered."""
+        self.add_page()
+        self._toc_top = self.get_y()
+        first = int((self.h - 25 - self.get_y() - TOC_TITLE_H) // TOC_LINE_H)
+        per_page = int((self.h - 25 - self.get_y()) // TOC_LINE_H)
+        pages = 1 + max(0, math.ceil((entries - first) / per_page))
+        self.insert_toc_placeholder(lambda pdf, outline: pdf._render_toc(outline), pages)
+
+    def _render_toc(self, outline):
+        self.set_x(self.l_margin)
+        self.set_font(FONT_FAMILY, "B", 17)
+        self.set_text_color(*BLACK)
+        self.cell(0, TOC_TITLE_H - 8, "Contents", new_x="LMARGIN", new_y="NEXT")
+        self.ln(8)
+        right = self.w - self.r_margin
+        for section in outline:
+            if section.level > TOC_MAX_LEVEL:
+                continue
+            # Reserved pages already have their header, which fpdf2 doesn't
+            # redraw while rendering the ToC, so break here and skip past it
+            if self.get_y() + TOC_LINE_H > self.page_break_trigger:
+                self.add_page()
+                self.set_y(self._toc_top)
+            x = self.l_margin + section.level * 6
+            self.set_font(FONT_FAMILY, "B" if section.level == 0 else "", 11 if section.level < 2 else 10)
+            self.set_text_color(*(BLACK if section.level < 2 else DARK_GREY))
+            name = section.name
+            avail = right - x - 16
+            while len(name) > 1 and self.get_string_width(name) > avail:
+                name = name[:-2] + "\u2026"
+            link = self.add_link(page=section.page_number)
+            self.set_x(x)
+            self.cell(right - x - 15, TOC_LINE_H, name, link=link)
+            self.cell(15, TOC_LINE_H, str(section.page_number), align="R", link=link,
+                      new_x="LMARGIN", new_y="NEXT")
+
+    def render_block(self, btype, data):
+        """Render one (type, data) block from iter_blocks()."""
+        if btype == "h1":
+            if self._first_title:
+                self.ln(25)
+                self._first_title = False
+            self.write_title(data)
+
+        elif btype == "h2":
+            self.write_h2(data)
+
+        elif btype == "h3":
+            self.write_h3(data)
+
+        elif btype == "h4":
+            self.write_h4(data)
+
+        elif btype == "para":
+            self.write_paragraph(data)
+
+        elif btype == "italic_para":
+            self.write_italic_paragraph(data)
+
+        elif btype == "bullet":
+            self.write_bullet(data)
+
+        elif btype == "numbered":
+            num, spans = data
+            self.write_numbered(num, spans)
+
+        elif btype == "code":
+            self.write_code_block(data)
+
+        elif btype == "table_header":
+            self.start_table(data)
+
+        elif btype == "table_row":
+            self.table_row(data)
+
+        elif btype == "table_end":
+            self.end_table()
+
+        elif btype == "hr":
+            self.h_rule()
+
+        elif btype == "image":
+            _, path = data
+            self.write_image(path)
+
+    def write_image(self, path):
+        """Centre an image in the text column. One that runs past the
+        bottom of the page moves to the next, and one taller than a page is
+        cut across pages, each showing its slice of the one embedded copy."""
+        path = os.path.join(self.base_dir, path)
+        if not os.path.isfile(path):
+            raise ValueError(f"image not found: {path}")
+        w, h = image_size(path, self.epw)
+        name = None if self.layout_only else image_file(path, w)
+        x = self.l_margin + (self.epw - w) / 2
+        room = self.page_break_trigger - self.y
+        page_h = self.page_break_trigger - self.t_margin - RUNNING_HEAD_H
+        if h > room and (h <= page_h or room < IMAGE_MIN_SLICE):
+            self._perform_page_break()
+        top = 0
+        while True:
+            shown = min(h - top, self.page_break_trigger - self.y)
+            if name is not None and shown < h:
+                with self.rect_clip(x, self.y, w, shown):
+                    self.image(name, x, self.y - top, w, h)
+            elif name is not None:
+                self.image(name, x, self.y, w, h)
+            self.ink += 1
+            self.y += shown
+            top += shown
+            if top >= h - FLOAT_TOLERANCE:
+                break
+            self._perform_page_break()
+        self.ln(4)
+
     def write_title(self, text):
         self.set_font(FONT_FAMILY, "B", 26)
         self.set_text_color(*BLACK)
+        self.bookmark(text, 0, 12)
         self.multi_cell(0, 12, text)
         self.ln(4)
 
@@ -71,6 +853,7 @@ class FrameworkPDF(FPDF):
         self.ln(6)
         self.set_font(FONT_FAMILY, "B", 17)
         self.set_text_color(*BLACK)
+        self.bookmark(text, 1, 9)
         self.multi_cell(0, 9, text)
         self.ln(3)
 
@@ -78,6 +861,7 @@ class FrameworkPDF(FPDF):
         self.ln(4)
         self.set_font(FONT_FAMILY, "B", 13)
         self.set_text_color(*DARK_GREY)
+        self.bookmark(text, 2, 7)
         self.multi_cell(0, 7, text)
         self.ln(2)
 
@@ -85,16 +869,23 @@ class FrameworkPDF(FPDF):
         self.ln(3)
         self.set_font(FONT_FAMILY, "B", 11)
         self.set_text_color(*DARK_GREY)
+        self.bookmark(text, 3, 6)
         self.multi_cell(0, 6, text)
         self.ln(1)
 
-    def write_paragraph(self, text):
+    def write_paragraph(self, spans):
         self.set_font(FONT_FAMILY, "", 10)
         self.set_text_color(*DARK_GREY)
-        self._write_rich_text(text, 10)
+        self.write_spans(spans, 10)
         self.ln(4)
 
-    def write_bullet(self, text, indent=8):
+    def write_italic_paragraph(self, spans):
+        self.set_font(FONT_FAMILY, "I", 10)
+        self.set_text_color(*MID_GREY)
+        self.write_spans(spans, 10, style="I")
+        self.ln(3)
+
+    def write_bullet(self, spans, indent=8):
         x = self.get_x()
         self.set_x(x + indent)
         self.set_font(FONT_FAMILY, "", 10)
@@ -104,12 +895,11 @@ class FrameworkPDF(FPDF):
         bullet_w = self.get_string_width(bullet_str)
         self.cell(bullet_w, 5, bullet_str)
 
-        available_w = self.w - self.r_margin - self.get_x()
-        self._write_rich_text(text.strip(), 10, w=available_w)
+        self.write_spans(spans, 10)
         self.set_x(25)
         self.ln(2)
 
-    def write_numbered(self, number, text, indent=8):
+    def write_numbered(self, number, spans, indent=8):
         x = self.get_x()
         self.set_x(x + indent)
         self.set_font(FONT_FAMILY, "B", 10)
@@ -118,279 +908,2061 @@ class FrameworkPDF(FPDF):
         num_w = self.get_string_width(num_str)
         self.cell(num_w, 5, num_str)
         self.set_font(FONT_FAMILY, "", 10)
-        available_w = self.w - self.r_margin - self.get_x()
-        self._write_rich_text(text.strip(), 10, w=available_w)
+        self.write_spans(spans, 10)
         self.set_x(25)
         self.ln(2)
 
     def write_code_block(self, lines):
+        """Render a fenced block as one or more page-sized chunks.
+
+        Each chunk gets its own background rect, so a listing longer than a
+        page continues on the next one instead of running off the bottom.
+        """
         self.ln(2)
-        self.set_fill_color(*CODE_BG)
-        self.set_draw_color(*LIGHT_GREY)
-        self.set_font(FONT_FAMILY, "", 8)
-        self.set_text_color(*DARK_GREY)
 
         line_h = 4.2
-        block_h = len(lines) * line_h + 8
+        pad = 4
         x_start = 25
         block_w = self.w - 50
-
-        # Page break check
-        if self.get_y() + block_h > self.h - 25:
+        bottom = self.h - 25
+        lines = [line.rstrip() for line in lines]
+
+        # Keep short blocks whole: move them to a new page if they don't fit here
+        if self.get_y() + len(lines) * line_h + 2 * pad > bottom:
+            if len(lines) * line_h + 2 * pad <= bottom - self.t_margin - 10:
+                self.add_page()
+
+        i = 0
+        while True:
+            fit = int((bottom - self.get_y() - 2 * pad) // line_h)
+            if fit < min(3, len(lines) - i):
+                # Not worth starting a chunk with only a line or two of room
+                self.add_page()
+                continue
+            chunk = lines[i:i + fit]
+            y_start = self._draw_code_chunk(chunk, x_start, block_w, line_h, pad)
+            i += len(chunk)
+            if i >= len(lines):
+                break
             self.add_page()
 
+        self.set_y(y_start + len(chunk) * line_h + 2 * pad + 2)
+        self.ln(2)
+
+    def _draw_code_chunk(self, chunk, x_start, block_w, line_h, pad):
+        self.set_fill_color(*CODE_BG)
+        self.set_draw_color(*LIGHT_GREY)
+        self.set_font(FONT_FAMILY, "", 8)
+        self.set_text_color(*DARK_GREY)
+
         y_start = self.get_y()
-        self.rect(x_start, y_start, block_w, block_h, style="DF")
+        self.rect(x_start, y_start, block_w, len(chunk) * line_h + 2 * pad, style="DF")
 
-        self.set_xy(x_start + 6, y_start + 4)
-        for line in lines:
+        self.set_xy(x_start + 6, y_start + pad)
+        for line in chunk:
             self.set_x(x_start + 6)
-            self.cell(block_w - 12, line_h, line.rstrip(), new_x="LMARGIN", new_y="NEXT")
-
-        self.set_y(y_start + block_h + 2)
+            self.cell(block_w - 12, line_h, line, new_x="LMARGIN", new_y="NEXT")
+        return y_start
+
+    def start_table(self, headers):
+        """Begin a table whose rows then arrive one at a time via table_row().
+
+        Columns are sized from the header and the first TABLE_LAYOUT_SAMPLE
+        rows, which are held back until then; every later row is drawn as it
+        arrives, so a table of any length is laid out in bounded memory. Later
+        rows still update each column's longest word and cell, and if a word
+        no longer fits its column the columns are refitted at the next page
+        break, before the header row is repeated.
+        """
         self.ln(2)
+        self._table_headers = headers
+        self._table_pending = []
+        self._table_measures = None
+        self._table_layout = None
+        self._table_refit = False
+
+    def table_row(self, cells):
+        n_cols = len(self._table_headers)
+        cells = cells[:n_cols]
+        # Pad if needed
+        while len(cells) < n_cols:
+            cells.append([])
+        if self._table_layout is not None:
+            self._measure_row(cells)
+            self._draw_row(cells)
+            return
+        self._table_pending.append(cells)
+        if len(self._table_pending) >= TABLE_LAYOUT_SAMPLE:
+            self._layout_table()
+
+    def end_table(self):
+        if self._table_layout is None:
+            self._layout_table()
+        self._table_headers = self._table_measures = self._table_layout = None
+        self.ln(4)
 
-    def write_table(self, headers, rows):
-        self.ln(2)
-        available_w = self.w - 50
+    def table_state(self):
+        """What a table carries from one row to the next, or None outside
+        a table; restore_table_state() lets another document continue it."""
+        if self._table_headers is None:
+            return None
+        measures = self._table_measures
+        if measures is not None:
+            measures = [list(part) for part in measures]
+        return (self._table_headers, list(self._table_pending), measures,
+                self._table_layout, self._table_refit)
+
+    def restore_table_state(self, state):
+        (self._table_headers, self._table_pending, self._table_measures,
+         self._table_layout, self._table_refit) = state
+
+    def _layout_table(self):
+        """Size the columns from the rows held back so far, then draw them."""
+        headers, pending = self._table_headers, self._table_pending
+        self._table_pending = []
+
+        self._table_measures = self._measure_columns(headers, pending)
+        self._fit_table()
+
+        # Keep the header row on the same page as the first data row
+        height = self._row_lines(headers, header=True)[1]
+        if pending:
+            height += self._row_lines(pending[0])[1]
+        if self.get_y() + height > self.h - 25:
+            self.add_page()
+
+        self._draw_row(headers, header=True)
+        for cells in pending:
+            self._draw_row(cells)
+
+    def _text_width(self, text, style):
+        """Width of text in the table font (served from the width cache)."""
+        self.set_font(FONT_FAMILY, style, TABLE_FONT_SIZE)
+        return self.get_string_width(text)
+
+    def _cell_pad(self):
+        """Horizontal space a cell loses to the 2 mm inset and fpdf's c_margin."""
+        return 4 + 2 * self.c_margin + 0.01
+
+    def _measure_cells(self, cells, style=""):
+        """Width of each cell and of its longest word, each span measured in
+        its own bold/italic style (code spans as body text)."""
+        widths = []
+        words = []
+        for spans in cells:
+            width = word = 0.0
+            for text, span_style, _ in spans:
+                run_style = "".join(s for s in "BI" if s in style or s in span_style)
+                width += self._text_width(text, run_style)
+                for part in text.split():
+                    word = max(word, self._text_width(part, run_style))
+            widths.append(width)
+            words.append(word)
+        return widths, words
+
+    def _measure_columns(self, headers, rows):
+        """Return [min_ws, pref_ws, sample] for _fit_columns(): each column's
+        longest word and longest cell, and the cell widths of the header and
+        up to TABLE_LAYOUT_SAMPLE rows."""
         n_cols = len(headers)
+        min_ws = [0.0] * n_cols
+        pref_ws = [0.0] * n_cols
+        sample = []
+        for r, cells in enumerate([headers] + rows):
+            widths, words = self._measure_cells(cells, "B" if r == 0 else "")
+            min_ws = list(map(max, min_ws, words))
+            pref_ws = list(map(max, pref_ws, widths))
+            if r <= TABLE_LAYOUT_SAMPLE:
+                sample.append(widths)
+        return [min_ws, pref_ws, sample]
+
+    def _fit_columns(self, measures, available_w):
+        """Size columns from their content instead of fixed ratios.
+
+        A column's minimum is its longest word and its preferred width is its
+        longest cell. If every preferred width fits, the slack is shared out in
+        proportion; otherwise each column gets its minimum plus a share of the
+        remaining space, and widths are then nudged between columns for as long
+        as that lowers the estimated total height of the sampled rows. When
+        even the minimums don't fit, _squeeze_columns() shares the width out.
+        """
+        min_ws, pref_ws, sample = measures
+        pad = self._cell_pad()
+        min_ws = [w + pad for w in min_ws]
+        pref_ws = [w + pad for w in pref_ws]
+
+        if sum(pref_ws) <= available_w:
+            scale = available_w / sum(pref_ws)
+            return [w * scale for w in pref_ws]
+        if sum(min_ws) >= available_w:
+            return self._squeeze_columns(min_ws, available_w)
+
+        spare = available_w - sum(min_ws)
+        flex = [p - m for p, m in zip(pref_ws, min_ws)]
+        col_ws = [m + spare * f / sum(flex) for m, f in zip(min_ws, flex)]
+        return self._balance_columns(col_ws, min_ws, sample, pad, available_w / 40)
+
+    @staticmethod
+    def _squeeze_columns(min_ws, available_w):
+        """Widths for columns whose longest words don't all fit: narrowest
+        first, each column that fits its share of the space left gets its
+        minimum, and the rest split what remains, so only columns holding
+        an over-long word (a URL, say) have to break inside a word."""
+        col_ws = [0.0] * len(min_ws)
+        room = available_w
+        order = sorted(range(len(min_ws)), key=lambda c: min_ws[c])
+        for i, c in enumerate(order):
+            share = room / (len(order) - i)
+            if min_ws[c] > share:
+                for rest in order[i:]:
+                    col_ws[rest] = share
+                break
+            col_ws[c] = min_ws[c]
+            room -= min_ws[c]
+        return col_ws
+
+    @staticmethod
+    def _balance_columns(col_ws, min_ws, sample, pad, step, max_moves=25):
+        """Greedily move `step` mm between columns while the estimated total
+        height (sum over rows of the tallest cell, in lines) keeps dropping."""
+        n_cols = len(col_ws)
+
+        def column_lines(c, w):
+            inner = w - pad
+            return [max(1, math.ceil(row[c] / inner)) for row in sample]
+
+        lines = [column_lines(c, w) for c, w in enumerate(col_ws)]
+
+        def total(cols):
+            return sum(max(row) for row in zip(*cols))
+
+        best = total(lines)
+        for _ in range(max_moves):
+            move = None
+            for src in range(n_cols):
+                if col_ws[src] - step < min_ws[src]:
+                    continue
+                src_lines = column_lines(src, col_ws[src] - step)
+                for dst in range(n_cols):
+                    if dst == src:
+                        continue
+                    trial = list(lines)
+                    trial[src] = src_lines
+                    trial[dst] = column_lines(dst, col_ws[dst] + step)
+                    height = total(trial)
+                    if height < best:
+                        best, move = height, (src, dst, trial)
+            if move is None:
+                break
+            src, dst, lines = move
+            col_ws[src] -= step
+            col_ws[dst] += step
+        return col_ws
+
+    def _fit_table(self):
+        col_ws = self._fit_columns(self._table_measures, self.w - 50)
+        # Left edge of every column, computed once per fit
+        col_xs = [25]
+        for w in col_ws[:-1]:
+            col_xs.append(col_xs[-1] + w)
+        self._table_layout = (col_xs, col_ws)
+        self._table_refit = False
+
+    def _measure_row(self, cells):
+        """Fold a streamed row into the column measures, and flag a refit if
+        one of its words is wider than its column. The row also replaces the
+        oldest one in the sample, so a refit balances for the current rows."""
+        widths, words = self._measure_cells(cells)
+        min_ws, pref_ws, sample = self._table_measures
+        sample.append(widths)
+        if len(sample) > TABLE_LAYOUT_SAMPLE + 1:
+            del sample[1]  # sample[0] is the header
+        pad = self._cell_pad()
+        for c, col_w in enumerate(self._table_layout[1]):
+            pref_ws[c] = max(pref_ws[c], widths[c])
+            if words[c] > min_ws[c]:
+                min_ws[c] = words[c]
+                if words[c] + pad > col_w:
+                    self._table_refit = True
+
+    def _row_lines(self, cells, header=False):
+        """Wrap a row's cells once; return (lines per cell, row height)."""
+        self.set_text_color(*(BLACK if header else DARK_GREY))
+        style = "B" if header else ""
+        cell_lines = [
+            self._span_lines(spans, w - 4, TABLE_FONT_SIZE, style)
+            for w, spans in zip(self._table_layout[1], cells)
+        ]
+        return cell_lines, max(max(len(lines), 1) for lines in cell_lines) * TABLE_LINE_H + 2
+
+    def _draw_row(self, cells, header=False):
+        """Draw a table row with proper multi-line cell handling.
+
+        Each cell's spans are wrapped exactly once; the same lines size the
+        row and are then printed, so nothing is laid out twice. A data row
+        that doesn't fit starts a new page, which begins with the header row.
+        """
+        cell_lines, max_h = self._row_lines(cells, header)
+
+        # Page break
+        if self.get_y() + max_h > self.h - 25:
+            self.add_page()
+            if not header:
+                if self._table_refit:
+                    self._fit_table()
+                    cell_lines, max_h = self._row_lines(cells)
+                self._draw_row(self._table_headers, header=True)
+
+        y_before = self.get_y()
+        self.set_draw_color(*LIGHT_GREY)
+        if header:
+            self.set_fill_color(*TABLE_HEADER_BG)
+
+        col_xs, col_ws = self._table_layout
+        for x, w, lines in zip(col_xs, col_ws, cell_lines):
+            # Draw cell border and fill
+            self.rect(x, y_before, w, max_h, style="DF" if header else "D")
+
+            # Write text inside; each fragment carries its own font and colour
+            self.set_xy(x + 2, y_before + 1)
+            self._print_lines(lines, TABLE_LINE_H)
 
-        # Distribute column widths
-        if n_cols == 2:
-            col_ws = [available_w * 0.35, available_w * 0.65]
-        elif n_cols == 3:
-            col_ws = [available_w * 0.28, available_w * 0.36, available_w * 0.36]
+        self.set_y(y_before + max_h)
+
+    def write_spans(self, spans, size, w=None, h=5, style=""):
+        """multi_cell for inline spans: wrap them to w from the current
+        position and print them, each span in its own style and font."""
+        if w is None:
+            w = self.w - self.r_margin - self.get_x()
+        self._print_lines(self._span_lines(spans, w, size, style), h)
+
+    def _span_lines(self, spans, w, size, style=""):
+        """Break spans into the TextLines multi_cell(w) would print (in a
+        layout-only document, just as many placeholders)."""
+        if self.layout_only:
+            return [None] * self._count_lines(spans, w, size, style)
+        return self._break_lines(spans, w, size, style)
+
+    def _break_lines(self, spans, w, size, style=""):
+        fragments = self._span_fragments(spans, size, style)
+        # Most table cells and list items fit on one line; skip fpdf2's
+        # character-by-character line breaker for those
+        width = sum(fragment.get_width() for fragment in fragments)
+        if width <= w - 2 * self.c_margin:
+            return [TextLine(fragments, width, 0, Align.L, 0, w)] if width else []
+        breaker = MultiLineBreak(fragments, w, (self.c_margin, self.c_margin))
+        lines = []
+        line = breaker.get_line()
+        while line is not None:
+            lines.append(line)
+            line = breaker.get_line()
+        return lines
+
+    def _print_lines(self, lines, h):
+        if self.layout_only:
+            # What _render_styled_text_line() does to the position
+            for _ in lines:
+                self._perform_page_break_if_need_be(h)
+                self.y += h
+                self.ink += 1
+            self._lasth = h
+            return
+        for line in lines:
+            self._render_styled_text_line(
+                line, h, new_x=XPos.LEFT, new_y=YPos.NEXT, prevent_font_change=True
+            )
+
+    def _span_fragments(self, spans, size, style=""):
+        """One fpdf2 Fragment per span, in the current text colour.
+
+        Span styles add to style; `code` is a point smaller and set in the
+        code font chain, and links are blue and underlined. Like
+        _select_font(), each span picks the first family covering its text.
+        """
+        saved = (self._run_font, self.font_family, self.font_style, self.font_size_pt)
+        fragments = []
+        for text, span_style, link in spans:
+            font_style = "".join(s for s in "BI" if s in style or s in span_style)
+            if "C" in span_style:
+                family = self._run_family(text, self._code_chain)
+                FPDF.set_font(self, family, font_style, size - 1)
+            else:
+                family = self._run_family(text, self._font_chain)
+                FPDF.set_font(self, family, font_style, size)
+            gstate = self._get_current_graphics_state()
+            # What cell() does to text in a core font
+            text = self.normalize_text(text)
+            if link:
+                gstate.text_color = self._link_color
+                gstate.underline = True
+            fragments.append(Fragment(text, gstate, self.k, link))
+        self._run_font = saved[0]
+        FPDF.set_font(self, *saved[1:])
+        return fragments
+
+    def _run_width(self, text, family, style, size):
+        """Width of text set in one font, as a Fragment would measure it.
+        Memoized per layout-only document: that pass measures every word."""
+        key = (family, style, size, text)
+        width = self._line_widths.get(key)
+        if width is None:
+            font = self.fonts.get(family + style)
+            if font is None:
+                saved = (self._run_font, self.font_family, self.font_style, self.font_size_pt)
+                FPDF.set_font(self, family, style, size)
+                self._run_font = saved[0]
+                FPDF.set_font(self, *saved[1:])
+                font = self.fonts[family + style]
+            if not isinstance(font, TTFFont):
+                text = text.encode(self.core_fonts_encoding).decode("latin-1")
+            width = self._line_widths[key] = font.get_text_width(text, size, None)[1] / self.k
+        return width
+
+    def _count_lines(self, spans, w, size, style=""):
+        """len(_span_lines(...)) from word widths: the words and spaces of
+        the line are added up and a line ends before the first word that
+        overflows it, which is where fpdf2's character-by-character breaker
+        ends it too. A word wider than a whole line is left to that breaker."""
+        max_w = w - 2 * self.c_margin
+        runs = []
+        for text, span_style, _ in spans:
+            font_style = "".join(s for s in "BI" if s in style or s in span_style)
+            if "C" in span_style:
+                family, run_size = self._run_family(text, self._code_chain), size - 1
+            else:
+                family, run_size = self._run_family(text, self._font_chain), size
+            runs.append((text, family, font_style, run_size))
+        width = sum(self._run_width(*run) for run in runs)
+        if width <= max_w:
+            return 1 if width else 0
+
+        lines = 1
+        line_w = 0.0   # the line so far, trailing spaces included
+        word_w = 0.0   # the word being added, since the last space
+        can_break = False
+        for text, family, font_style, run_size in runs:
+            for part in SPACE_SPLIT_RE.split(text):
+                if not part:
+                    continue
+                part_w = self._run_width(part, family, font_style, run_size)
+                if part[0] == " ":
+                    if len(part) > 1:
+                        return len(self._break_lines(spans, w, size, style))
+                    if line_w + part_w - max_w > FLOAT_TOLERANCE:
+                        # A space that overflows ends the line and is dropped
+                        lines += 1
+                        line_w = 0.0
+                        can_break = False
+                    else:
+                        line_w += part_w
+                        can_break = True
+                    word_w = 0.0
+                elif line_w + part_w - max_w <= FLOAT_TOLERANCE:
+                    line_w += part_w
+                    word_w += part_w
+                elif can_break and word_w + part_w - max_w <= FLOAT_TOLERANCE:
+                    # Break at the last space; the word opens the next line
+                    lines += 1
+                    line_w = word_w = word_w + part_w
+                    can_break = False
+                else:
+                    return len(self._break_lines(spans, w, size, style))
+        return lines
+
+
+# -- Line tokenizer --
+# Each stripped line is classified by a handler chosen from its first
+# character, so every line costs one dict lookup and at most one precompiled
+# regex match instead of a chain of startswith checks.
+HEADING_RE = re.compile(r"(#{1,4}) ")
+NUMBERED_RE = re.compile(r"(\d+)\.\s+(.+)")
+TABLE_SEP_RE = re.compile(r"\s*[-:]+\s*(?:\|\s*[-:]+\s*)*")
+# ![alt](path) on a line of its own; <path> may hold spaces, like the
+# diagram exports in docs/
+IMAGE_RE = re.compile(r"!\[([^\]]*)\]\((?:<([^>]+)>|([^)]+))\)")
+# A scheme (two letters or more, so C:\ stays a path) or //host: a remote
+# image, like a CI badge, which stays a paragraph
+IMAGE_URL_RE = re.compile(r"(?:[A-Za-z][A-Za-z0-9+.-]+:|//)")
+
+# -- Inline spans --
+# Text blocks are split into (text, style, link) spans once, while parsing,
+# so rendering never looks at markup again. style is a subset of "BIC" (bold,
+# italic, code) and link a URL or None. Earlier alternatives win at the same
+# position: `code` is literal, and **bold** is tried before *italic*. A URL
+# may hold one level of balanced parentheses, as Wikipedia links do.
+INLINE_MARKUP_RE = re.compile(r"[*`\[]")
+INLINE_RE = re.compile(
+    r"`([^`]+)`"
+    r"|\[([^\]]+)\]\(((?:[^()\s]|\([^()\s]*\))+)\)"
+    r"|\*\*(?=\S)(.+?)(?<=\S)\*\*"
+    r"|\*(?=[^\s*])(.+?)(?<=[^\s*])\*"
+)
+
+
+def _add_style(style, flag):
+    return "".join(s for s in "BIC" if s in style or s == flag)
+
+
+def parse_spans(text, style="", link=None):
+    """Split inline markdown into a list of (text, style, link) spans.
+
+    Markers without a partner (a lone "*", "2 * 3") are kept as text.
+    """
+    if INLINE_MARKUP_RE.search(text) is None:
+        return [(text, style, link)]
+    spans = []
+    pos = 0
+    for m in INLINE_RE.finditer(text):
+        if m.start() > pos:
+            spans.append((text[pos:m.start()], style, link))
+        code, label, url, bold, italic = m.groups()
+        if code is not None:
+            spans.append((code, _add_style(style, "C"), link))
+        elif label is not None:
+            spans.extend(parse_spans(label, style, url))
+        elif bold is not None:
+            spans.extend(parse_spans(bold, _add_style(style, "B"), link))
         else:
-            col_ws = [available_w / n_cols] * n_cols
+            spans.extend(parse_spans(italic, _add_style(style, "I"), link))
+        pos = m.end()
+    if pos < len(text):
+        spans.append((text[pos:], style, link))
+
+    # Nested markup can leave neighbours in the same style; merge them
+    merged = [spans[0]]
+    for span in spans[1:]:
+        last = merged[-1]
+        if span[1:] == last[1:]:
+            merged[-1] = (last[0] + span[0],) + last[1:]
+        else:
+            merged.append(span)
+    return merged
 
-        line_h = 5.5
 
-        # Header row
-        self.set_fill_color(*TABLE_HEADER_BG)
-        self.set_draw_color(*LIGHT_GREY)
-        self.set_font(FONT_FAMILY, "B", 8.5)
-        self.set_text_color(*BLACK)
-        x_start = 25
-        self.set_x(x_start)
+def span_text(spans):
+    """The plain text of a list of spans."""
+    return "".join(text for text, _, _ in spans)
 
-        # Measure header height
-        header_texts = [self._strip_formatting(h) for h in headers]
-        self._draw_row(x_start, col_ws, header_texts, line_h, fill=True, bold=True)
 
-        # Data rows
-        self.set_font(FONT_FAMILY, "", 8.5)
-        self.set_text_color(*DARK_GREY)
-        for row in rows:
-            cell_texts = [self._strip_formatting(c).strip() for c in row]
-            # Pad if needed
-            while len(cell_texts) < n_cols:
-                cell_texts.append("")
-            self._draw_row(x_start, col_ws, cell_texts, line_h, fill=False, bold=False)
+def _tok_para(stripped):
+    return ("para", parse_spans(stripped))
 
-        self.ln(4)
 
-    def _draw_row(self, x_start, col_ws, texts, line_h, fill=False, bold=False):
-        """Draw a table row with proper multi-line cell handling."""
-        # Calculate max lines needed
-        max_h = line_h + 2
-        for i, text in enumerate(texts):
-            self.set_font(FONT_FAMILY, "B" if bold else "", 8.5)
-            txt_w = self.get_string_width(text) + 4
-            lines_needed = max(1, int(txt_w / col_ws[i]) + 1)
-            cell_h = lines_needed * line_h + 2
-            max_h = max(max_h, cell_h)
+def _tok_image(stripped):
+    m = IMAGE_RE.fullmatch(stripped)
+    if m is None:
+        return _tok_para(stripped)
+    alt, bracketed, path = m.groups()
+    path = (bracketed or path).strip()
+    if IMAGE_URL_RE.match(path):
+        return _tok_para(stripped)
+    return ("image", (alt.strip(), path))
 
-        # Page break
-        if self.get_y() + max_h > self.h - 25:
-            self.add_page()
 
-        y_before = self.get_y()
+def _tok_heading(stripped):
+    m = HEADING_RE.match(stripped)
+    if m is None:
+        return _tok_para(stripped)
+    level = len(m.group(1))
+    # Headings are set in one style, so only their text is kept
+    return (f"h{level}", span_text(parse_spans(stripped[level + 1:].strip())))
 
-        for i, text in enumerate(texts):
-            self.set_xy(x_start + sum(col_ws[:i]), y_before)
-            self.set_font(FONT_FAMILY, "B" if bold else "", 8.5)
 
-            if fill:
-                self.set_fill_color(*TABLE_HEADER_BG)
+def _tok_numbered(stripped):
+    m = NUMBERED_RE.match(stripped)
+    if m is None:
+        return _tok_para(stripped)
+    return ("numbered", (m.group(1), parse_spans(m.group(2))))
 
-            # Draw cell border and fill
-            self.rect(
-                x_start + sum(col_ws[:i]), y_before,
-                col_ws[i], max_h,
-                style="DF" if fill else "D"
-            )
 
-            # Write text inside
-            self.set_xy(x_start + sum(col_ws[:i]) + 2, y_before + 1)
-            self.multi_cell(col_ws[i] - 4, line_h, text)
+def _tok_dash(stripped):
+    if stripped == "---":
+        return ("hr", None)
+    if stripped.startswith("- "):
+        return ("bullet", parse_spans(stripped[2:].lstrip()))
+    return _tok_para(stripped)
 
-        self.set_y(y_before + max_h)
 
-    def _strip_formatting(self, text):
-        """Remove markdown bold/italic markers."""
-        text = re.sub(r'\*\*(.+?)\*\*', r'\1', text)
-        text = re.sub(r'\*(.+?)\*', r'\1', text)
-        text = re.sub(r'`(.+?)`', r'\1', text)
-        return text
+def _tok_star(stripped):
+    if stripped.startswith("* "):
+        return ("bullet", parse_spans(stripped[2:].lstrip()))
+    if stripped.endswith("*") and not stripped.startswith("**"):
+        return ("italic_para", parse_spans(stripped[1:-1]))
+    return _tok_para(stripped)
 
-    def _write_rich_text(self, text, size, w=None):
-        """Write text with bold segments handled manually."""
-        if w is None:
-            w = self.w - self.r_margin - self.get_x()
 
-        # fpdf2 markdown=True handles **bold** with Unicode fonts
-        self.set_font(FONT_FAMILY, "", size)
-        self.set_text_color(*DARK_GREY)
-        self.multi_cell(w, 5, text, markdown=True)
+LINE_HANDLERS = {"#": _tok_heading, "-": _tok_dash, "*": _tok_star, "!": _tok_image}
+LINE_HANDLERS.update((digit, _tok_numbered) for digit in "0123456789")
 
 
-def parse_markdown(filepath):
-    """Parse markdown into structured blocks."""
-    with open(filepath, "r") as f:
-        content = f.read()
+def tokenize_line(stripped):
+    """Classify one stripped, non-table, non-code line as a (btype, data) block."""
+    if not stripped:
+        return ("empty", None)
+    return LINE_HANDLERS.get(stripped[0], _tok_para)(stripped)
 
-    lines = content.split("\n")
-    blocks = []
-    i = 0
+
+def iter_blocks(lines):
+    """Yield (btype, data) blocks from an iterable of lines.
+
+    Each block is yielded as soon as it is complete, so a file handle can be
+    passed straight in and rendering starts before the whole file has been read.
+    Tables are streamed too: a "table_header" block, one "table_row" block per
+    row and a closing "table_end", so no table is ever held in memory.
+    """
     in_code = False
     code_lines = []
     in_table = False
-    table_headers = []
-    table_rows = []
 
-    while i < len(lines):
-        line = lines[i]
+    for line in lines:
+        stripped = line.strip()
+        first = stripped[:1]
 
         # Code block toggle
-        if line.strip().startswith("```"):
+        if first == "`" and stripped.startswith("```"):
             if in_code:
-                blocks.append(("code", code_lines))
+                yield ("code", code_lines)
                 code_lines = []
                 in_code = False
             else:
                 if in_table:
-                    blocks.append(("table", (table_headers, table_rows)))
-                    table_headers, table_rows = [], []
+                    yield ("table_end", None)
                     in_table = False
                 in_code = True
-            i += 1
             continue
 
         if in_code:
-            code_lines.append(line)
-            i += 1
+            code_lines.append(line.rstrip("\n"))
             continue
 
         # Table
-        if "|" in line and line.strip().startswith("|"):
-            cells = [c.strip() for c in line.strip().strip("|").split("|")]
-            if all(re.match(r'^[-:]+$', c) for c in cells):
-                i += 1
+        if first == "|":
+            inner = stripped.strip("|")
+            if TABLE_SEP_RE.fullmatch(inner):
                 continue
+            cells = [parse_spans(c.strip()) for c in inner.split("|")]
             if not in_table:
-                table_headers = cells
+                yield ("table_header", cells)
                 in_table = True
             else:
-                table_rows.append(cells)
-            i += 1
+                yield ("table_row", cells)
             continue
-        else:
-            if in_table:
-                blocks.append(("table", (table_headers, table_rows)))
-                table_headers, table_rows = [], []
-                in_table = False
+        if in_table:
+            yield ("table_end", None)
+            in_table = False
 
-        stripped = line.strip()
-
-        if stripped == "---":
-            blocks.append(("hr", None))
-        elif stripped.startswith("# ") and not stripped.startswith("## "):
-            blocks.append(("h1", stripped[2:].strip()))
-        elif stripped.startswith("## "):
-            blocks.append(("h2", stripped[3:].strip()))
-        elif stripped.startswith("### "):
-            blocks.append(("h3", stripped[4:].strip()))
-        elif stripped.startswith("#### "):
-            blocks.append(("h4", stripped[5:].strip()))
-        elif re.match(r'^(\d+)\.\s+(.+)', stripped):
-            m = re.match(r'^(\d+)\.\s+(.+)', stripped)
-            blocks.append(("numbered", (m.group(1), m.group(2))))
-        elif stripped.startswith("- ") or stripped.startswith("* "):
-            blocks.append(("bullet", stripped[2:]))
-        elif stripped == "":
-            blocks.append(("empty", None))
-        elif stripped.startswith("*") and stripped.endswith("*") and not stripped.startswith("**"):
-            blocks.append(("italic_para", stripped[1:-1]))
-        else:
-            blocks.append(("para", stripped))
-
-        i += 1
+        yield tokenize_line(stripped)
 
     if in_table:
-        blocks.append(("table", (table_headers, table_rows)))
+        yield ("table_end", None)
     if in_code:
-        blocks.append(("code", code_lines))
-
-    return blocks
+        yield ("code", code_lines)
 
 
-def build_pdf(blocks, output_path):
-    pdf = FrameworkPDF()
-    pdf.add_page()
+def stream_markdown(filepath):
+    """Lazily parse a markdown file, reading it one line at a time."""
+    with open(filepath, "r") as f:
+        yield from iter_blocks(f)
 
-    is_first = True
 
+def parse_markdown(filepath):
+    """Parse markdown into structured blocks."""
+    return list(stream_markdown(filepath))
+
+
+# -- Block IR --
+# Parsed blocks are cached in a compact binary file next to the source
+# (docs/the-framework.md -> docs/.the-framework.md.ir) so the same markdown
+# feeding several outputs is only parsed once. Version 4 of the IR is the
+# stream of (btype, data) tuples produced by iter_blocks, where spans is a
+# list of (text, style, link) tuples from parse_spans() and cells a list of
+# spans, one per table cell:
+#
+#   ("h1".."h4", text)          ("para" | "italic_para" | "bullet", spans)
+#   ("numbered", (num, spans))  ("code", [line, ...])
+#   ("image", (alt, path))      path as written, relative to the markdown file
+#   ("table_header", cells)     ("table_row", cells)
+#   ("table_end" | "hr" | "empty", None)
+#
+# File layout: IR_HEADER, then a zlib stream of length-prefixed chunks, each
+# a marshal-encoded list of up to IR_CHUNK blocks. Bump IR_VERSION whenever a
+# payload shape changes.
+IR_VERSION = 4
+IR_MAGIC = b"MDIR"
+# magic, IR version, source size, source mtime_ns, source sha256, parser id
+IR_HEADER = struct.Struct("<4sHQQ32s8s")
+IR_CHUNK_LEN = struct.Struct("<I")
+IR_CHUNK = 4096
+IR_READ_SIZE = 1 << 16  # compressed bytes read from the IR file at a time
+
+
+def ir_path(filepath):
+    head, tail = os.path.split(filepath)
+    return os.path.join(head, f".{tail}.ir")
+
+
+def _parser_id():
+    # The parser lives in this file, so any edit to it invalidates old IR too
+    return bytes.fromhex(_file_digest(__file__)[:16])
+
+
+def read_ir(filepath):
+    """Return an iterator over the cached blocks for filepath, or None if the
+    IR is missing or stale. A matching size and mtime is trusted; otherwise
+    the source hash decides. The body is decompressed and decoded one chunk
+    at a time as the blocks are consumed, so reading the IR holds no more of
+    the document in memory than parsing it would."""
+    try:
+        f = open(ir_path(filepath), "rb")
+    except OSError:
+        return None
+    try:
+        magic, version, size, mtime_ns, digest, parser = IR_HEADER.unpack(f.read(IR_HEADER.size))
+        if magic != IR_MAGIC or version != IR_VERSION or parser != _parser_id():
+            f.close()
+            return None
+        stat = os.stat(filepath)
+        if (size, mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+            if digest != bytes.fromhex(_file_digest(filepath)):
+                f.close()
+                return None
+    except (OSError, struct.error):
+        f.close()
+        return None
+    return _iter_ir_chunks(f)
+
+
+def _iter_ir_chunks(f):
+    """Yield the blocks of the IR body read from f, closing it at the end."""
+    with f:
+        decompressor = zlib.decompressobj()
+        buf = bytearray()
+        while True:
+            compressed = f.read(IR_READ_SIZE)
+            buf += decompressor.decompress(compressed) if compressed else decompressor.flush()
+            pos = 0
+            while len(buf) - pos >= IR_CHUNK_LEN.size:
+                (length,) = IR_CHUNK_LEN.unpack_from(buf, pos)
+                start = pos + IR_CHUNK_LEN.size
+                if len(buf) - start < length:
+                    break
+                chunk = marshal.loads(bytes(buf[start:start + length]))
+                pos = start + length
+                yield from chunk
+            del buf[:pos]
+            if not compressed:
+                return
+
+
+def cached_blocks(filepath):
+    """Yield blocks for filepath from its IR file, or parse the source and
+    write the IR alongside while streaming the blocks on to the caller."""
+    blocks = read_ir(filepath)
+    if blocks is not None:
+        yield from blocks
+        return
+
+    stat = os.stat(filepath)
+    header = IR_HEADER.pack(
+        IR_MAGIC, IR_VERSION, stat.st_size, stat.st_mtime_ns,
+        bytes.fromhex(_file_digest(filepath)), _parser_id(),
+    )
+    compressor = zlib.compressobj(1)
+
+    def write_chunk(out, chunk):
+        payload = marshal.dumps(chunk)
+        out.write(compressor.compress(IR_CHUNK_LEN.pack(len(payload)) + payload))
+
+    # A caller that stops early leaves no IR file behind
+    with _atomic_write(ir_path(filepath)) as out:
+        out.write(header)
+        chunk = []
+        for block in stream_markdown(filepath):
+            chunk.append(block)
+            if len(chunk) == IR_CHUNK:
+                write_chunk(out, chunk)
+                chunk = []
+            yield block
+        if chunk:
+            write_chunk(out, chunk)
+        out.write(compressor.flush())
+
+
+# -- Selective rendering --
+# To proof part of a long document, --section picks sections by heading and
+# --pages picks the pages of the last full build. Both resolve to ranges of
+# block numbers, through a heading index or the page index every full build
+# records in the build cache, and only those blocks are rendered, to
+# <name>.proof.pdf, so the full PDF and its cache entry are left alone.
+TABLE_CONTINUATION = ("table_row", "table_end")
+
+
+def heading_index(blocks):
+    """[(block number, outline level, text)] for every heading in blocks."""
+    return [
+        (i, HEADING_LEVELS[btype], data)
+        for i, (btype, data) in enumerate(blocks)
+        if btype in HEADING_LEVELS
+    ]
+
+
+def match_headings(names, texts):
+    """Positions in texts selected by names. A name picks the headings equal
+    to it, ignoring case, or failing that every heading that contains it."""
+    lowered = [text.lower() for text in texts]
+    positions = set()
+    for name in names:
+        name = name.strip().lower()
+        found = [k for k, text in enumerate(lowered) if text == name]
+        if not found:
+            found = [k for k, text in enumerate(lowered) if name in text]
+        if not found:
+            raise ValueError(f"no heading matches {name!r}")
+        positions.update(found)
+    return sorted(positions)
+
+
+def section_ranges(blocks, names):
+    """Block ranges of the sections headed by names: each runs from its
+    heading to the next heading at the same level or above."""
+    index = heading_index(blocks)
+    ranges = []
+    for k in match_headings(names, [text for _, _, text in index]):
+        start, level, _ = index[k]
+        end = next((i for i, lvl, _ in index[k + 1:] if lvl <= level), len(blocks))
+        ranges.append((start, end))
+    return ranges
+
+
+def page_range(blocks, page_index, first, last):
+    """Block range for pages first..last of the build page_index came from,
+    widened so it never starts or ends inside a table."""
+    if not 1 <= first <= last:
+        raise ValueError(f"bad page range {first}-{last}")
+    if first > len(page_index):
+        raise ValueError(f"the last full build has only {len(page_index)} pages")
+    start = min(page_index[first - 1], len(blocks))
+    end = page_index[last] + 1 if last < len(page_index) else len(blocks)
+    end = min(end, len(blocks))
+    while start > 0 and blocks[start][0] in TABLE_CONTINUATION:
+        start -= 1
+    while end < len(blocks) and blocks[end][0] in TABLE_CONTINUATION:
+        end += 1
+    return start, end
+
+
+def parse_pages(text):
+    """"7" or "7-9" -> (first, last)."""
+    first, _, last = text.partition("-")
+    return int(first), int(last or first)
+
+
+def proof_path(output_path):
+    return os.path.splitext(output_path)[0] + ".proof.pdf"
+
+
+def render_proof(input_path, output_path, sections=(), pages=None, use_ir=True):
+    """Render only the chosen sections and/or pages of input_path.
+
+    pages is a (first, last) pair numbered as in output_path, the document's
+    last full build, which has to be of the current input_path. Returns (proof path, blocks rendered, total blocks).
+    """
+    blocks = list(cached_blocks(input_path) if use_ir else stream_markdown(input_path))
+    ranges = section_ranges(blocks, sections) if sections else []
+    if pages is not None:
+        page_index = load_page_index(output_path, input_path)
+        if page_index is None:
+            raise ValueError(f"no page index for {output_path}; build the whole document first")
+        ranges.append(page_range(blocks, page_index, *pages))
+
+    # Overlapping ranges (a section and one of its subsections) render once
+    selected = []
+    covered = 0
+    for start, end in sorted(ranges):
+        start = max(start, covered)
+        selected.extend(blocks[start:end])
+        covered = max(covered, end)
+    out = build_pdf(selected, proof_path(output_path), base_dir=os.path.dirname(input_path))
+    return out, len(selected), len(blocks)
+
+
+# -- HTML preview --
+# A second renderer for the same block stream, for browser previews and the
+# admin tooling: no fonts to load and no pages to lay out, so a document
+# renders in milliseconds. The stylesheet mirrors FrameworkPDF (colours,
+# point sizes and line heights in mm, the A4 text column); only final
+# artifacts need the PDF.
+def _css(rgb):
+    return "#{:02x}{:02x}{:02x}".format(*rgb)
+
+
+HTML_CSS = f"""
+body {{ max-width: 160mm; margin: 0 auto; padding: 25mm 8mm; color: {_css(DARK_GREY)};
+  font: 10pt/5mm Helvetica, Arial, "Arial Unicode MS", sans-serif; }}
+h1, h2, h3, h4 {{ font-weight: bold; }}
+h1 {{ font-size: 26pt; line-height: 12mm; margin: 0 0 4mm; color: {_css(BLACK)}; }}
+h2 {{ font-size: 17pt; line-height: 9mm; margin: 6mm 0 3mm; color: {_css(BLACK)}; }}
+h3 {{ font-size: 13pt; line-height: 7mm; margin: 4mm 0 2mm; }}
+h4 {{ font-size: 11pt; line-height: 6mm; margin: 3mm 0 1mm; }}
+p {{ margin: 0 0 4mm; }}
+p.aside {{ font-style: italic; color: {_css(MID_GREY)}; margin-bottom: 3mm; }}
+ul, ol {{ margin: 0 0 2mm; padding-left: 14mm; }}
+li {{ margin-bottom: 2mm; }}
+ol > li::marker {{ font-weight: bold; }}
+a {{ color: {_css(LINK_BLUE)}; }}
+code {{ font: 9pt Courier, monospace; }}
+pre {{ background: {_css(CODE_BG)}; border: 0.2mm solid {_css(LIGHT_GREY)}; margin: 2mm 0 4mm;
+  padding: 4mm 6mm; font: 8pt/4.2mm Courier, monospace; overflow-x: auto; }}
+pre code {{ font: inherit; }}
+table {{ border-collapse: collapse; width: 100%; margin: 2mm 0 4mm;
+  font-size: {TABLE_FONT_SIZE}pt; line-height: {TABLE_LINE_H}mm; }}
+th, td {{ border: 0.2mm solid {_css(LIGHT_GREY)}; padding: 1mm 2mm; text-align: left;
+  vertical-align: top; }}
+th {{ background: {_css(TABLE_HEADER_BG)}; font-weight: bold; }}
+hr {{ border: 0; border-top: 0.2mm solid {_css(RULE_GREY)}; margin: 4mm 0 6mm; }}
+img {{ display: block; max-width: 100%; margin: 0 auto 4mm; }}
+"""
+
+# Link schemes a preview may point at; "" is a relative link or #anchor.
+# Anything else (javascript:, data:, ...) renders as plain text.
+HTML_LINK_SCHEMES = ("", "http", "https", "mailto")
+
+
+def preview_path(input_path):
+    return os.path.splitext(input_path)[0] + ".preview.html"
+
+
+def safe_link(link):
+    """Whether link may become an href in a preview."""
+    if any(ord(c) < 0x20 or ord(c) == 0x7f for c in link):
+        return False
+    try:
+        return urlsplit(link).scheme.lower() in HTML_LINK_SCHEMES
+    except ValueError:
+        return False
+
+
+def spans_html(spans):
+    """Inline spans as HTML, each in the elements its style calls for."""
+    parts = []
+    for text, style, link in spans:
+        text = html.escape(text, quote=False)
+        if "C" in style:
+            text = f"<code>{text}</code>"
+        if "I" in style:
+            text = f"<em>{text}</em>"
+        if "B" in style:
+            text = f"<strong>{text}</strong>"
+        if link and safe_link(link):
+            text = f'<a href="{html.escape(link)}">{text}</a>'
+        parts.append(text)
+    return "".join(parts)
+
+
+def _anchor(text, used):
+    """A unique id for a heading, so previews can link to sections."""
+    slug = re.sub(r"[^\w]+", "-", text.lower()).strip("-") or "section"
+    anchor, n = slug, 1
+    while anchor in used:
+        n += 1
+        anchor = f"{slug}-{n}"
+    used.add(anchor)
+    return anchor
+
+
+def iter_html(blocks, title=""):
+    """Yield an HTML page for blocks, one piece per block.
+
+    Consecutive bullet or numbered blocks share one list element, and a
+    table streams row by row just as it does into FrameworkPDF.
+    """
+    yield (f'<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="utf-8">\n'
+           f"<title>{html.escape(title)}</title>\n<style>{HTML_CSS}</style>\n</head>\n<body>\n")
+    open_list = None
+    anchors = set()
     for btype, data in blocks:
-        if btype == "h1":
-            if is_first:
-                pdf.ln(25)
-                pdf.write_title(data)
-                is_first = False
-            else:
-                pdf.write_title(data)
-
-        elif btype == "h2":
-            pdf.write_h2(data)
+        if open_list and btype != open_list:
+            yield "</ul>\n" if open_list == "bullet" else "</ol>\n"
+            open_list = None
 
-        elif btype == "h3":
-            pdf.write_h3(data)
-
-        elif btype == "h4":
-            pdf.write_h4(data)
+        if btype in HEADING_LEVELS:
+            text = html.escape(data, quote=False)
+            yield f'<{btype} id="{_anchor(data, anchors)}">{text}</{btype}>\n'
 
         elif btype == "para":
-            pdf.write_paragraph(data)
+            yield f"<p>{spans_html(data)}</p>\n"
 
         elif btype == "italic_para":
-            pdf.set_font(FONT_FAMILY, "I", 10)
-            pdf.set_text_color(*MID_GREY)
-            pdf.multi_cell(0, 5, data)
-            pdf.ln(3)
+            yield f'<p class="aside">{spans_html(data)}</p>\n'
 
         elif btype == "bullet":
-            pdf.write_bullet(data)
+            if open_list is None:
+                yield "<ul>\n"
+                open_list = btype
+            yield f"<li>{spans_html(data)}</li>\n"
 
         elif btype == "numbered":
-            num, text = data
-            pdf.write_numbered(num, text)
+            num, spans = data
+            if open_list is None:
+                yield "<ol>\n"
+                open_list = btype
+            yield f'<li value="{html.escape(num)}">{spans_html(spans)}</li>\n'
 
         elif btype == "code":
-            pdf.write_code_block(data)
+            code = html.escape("\n".join(line.rstrip() for line in data), quote=False)
+            yield f"<pre><code>{code}</code></pre>\n"
 
-        elif btype == "table":
-            headers, rows = data
-            pdf.write_table(headers, rows)
+        elif btype == "table_header":
+            cells = "".join(f"<th>{spans_html(cell)}</th>" for cell in data)
+            yield f"<table>\n<thead><tr>{cells}</tr></thead>\n<tbody>\n"
+
+        elif btype == "table_row":
+            yield "<tr>" + "".join(f"<td>{spans_html(cell)}</td>" for cell in data) + "</tr>\n"
+
+        elif btype == "table_end":
+            yield "</tbody>\n</table>\n"
 
         elif btype == "hr":
-            pdf.h_rule()
+            yield "<hr>\n"
+
+        elif btype == "image":
+            alt, path = data
+            if path.lower().endswith(PLANTUML_EXTS):
+                # Browsers can't draw PlantUML sources; only the PDF has the diagram
+                yield f'<p class="aside">{html.escape(alt or path, quote=False)}</p>\n'
+            else:
+                yield f'<img src="{html.escape(quote(path))}" alt="{html.escape(alt)}">\n'
+
+    if open_list:
+        yield "</ul>\n" if open_list == "bullet" else "</ol>\n"
+    yield "</body>\n</html>\n"
+
+
+def build_html(blocks, output_path, title=""):
+    """Write the HTML preview of blocks to output_path, a path or a text
+    stream. blocks may be any iterable, like build_pdf()'s."""
+    if hasattr(output_path, "write"):
+        output_path.writelines(iter_html(blocks, title))
+    else:
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.writelines(iter_html(blocks, title))
+    return output_path
+
+
+# -- Output size --
+# fpdf2 writes a classic cross-reference table and no object streams, so its
+# output can be rewritten object by object: identical objects (per-page
+# resource dictionaries, the subsets of font styles that were registered but
+# never used) are merged, uncompressed streams are deflated, deflated ones
+# are recompressed at level 9, and the file is renumbered.
+PDF_OBJ_RE = re.compile(rb"\s*(\d+) 0 obj\n")
+PDF_REF_RE = re.compile(rb"\b(\d+) 0 R\b")
+PDF_LENGTH_RE = re.compile(rb"/Length (\d+)")
+PDF_BODY_TOKEN_RE = re.compile(rb"\(|\bstream\n|endobj")
+PDF_TRAILER_RE = re.compile(rb"trailer\s*(<<.*?>>)\s*startxref", re.S)
+PDF_ROLE_RE = re.compile(rb"/(Contents|FontFile[23]?|ToUnicode|CIDToGIDMap|Resources) (\d+) 0 R")
+PDF_TYPE_RE = re.compile(rb"/Type /(\w+)")
+PDF_ROLES = {
+    b"Contents": "content", b"FontFile": "font file", b"FontFile2": "font file",
+    b"FontFile3": "font file", b"ToUnicode": "cmap", b"CIDToGIDMap": "cid map",
+    b"Resources": "resources",
+}
+PDF_TYPES = {
+    b"Page": "page", b"Pages": "page tree", b"Catalog": "catalog", b"Font": "font",
+    b"FontDescriptor": "font descriptor", b"XObject": "image", b"Outlines": "outline",
+}
+
+
+def read_pdf(data):
+    """Split fpdf2 output into (header, {number: (dict, stream)}, trailer).
+    stream is None for plain objects."""
+    first = PDF_OBJ_RE.search(data)
+    header = data[:first.start()].rstrip(b"\n") + b"\n"
+    objects = {}
+    pos = first.start()
+    while True:
+        m = PDF_OBJ_RE.match(data, pos)
+        if m is None:
+            break
+        start = i = m.end()
+        # Scan for the end of the object, stepping over string literals (a
+        # bookmark title may well say "endobj") and streams, by their /Length
+        while True:
+            token = PDF_BODY_TOKEN_RE.search(data, i)
+            if token.group() == b"(":
+                i = _string_end(data, token.start())
+            elif token.group() == b"endobj":
+                objects[int(m.group(1))] = (data[start:token.start()].strip(), None)
+                end = token.start()
+                break
+            else:
+                head = data[start:token.start()].strip()
+                length = int(PDF_LENGTH_RE.search(head).group(1))
+                stream = data[token.end():token.end() + length]
+                end = data.find(b"endobj", token.end() + length)
+                objects[int(m.group(1))] = (head, stream)
+                break
+        pos = end + 6
+    trailer = PDF_TRAILER_RE.search(data, pos).group(1)
+    return header, objects, trailer
+
+
+def _serialize_object(number, head, stream):
+    if stream is None:
+        return b"%d 0 obj\n%s\nendobj\n" % (number, head)
+    return b"%d 0 obj\n%s\nstream\n%s\nendstream\nendobj\n" % (number, head, stream)
+
+
+def write_pdf(header, objects, trailer):
+    out = bytearray(header)
+    offsets = []
+    for number in sorted(objects):
+        offsets.append(len(out))
+        out += _serialize_object(number, *objects[number])
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(offsets) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    trailer = re.sub(rb"/Size \d+", b"/Size %d" % (len(offsets) + 1), trailer)
+    out += b"trailer\n%s\nstartxref\n%d\n%%%%EOF\n" % (trailer, xref)
+    return bytes(out)
+
+
+def _string_end(buf, i):
+    """Index just past the literal string starting at buf[i] == '('."""
+    depth = 0
+    while i < len(buf):
+        c = buf[i]
+        if c == 0x5C:  # backslash escape
+            i += 2
+            continue
+        if c == 0x28:
+            depth += 1
+        elif c == 0x29:
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return i
+
+
+def _map_refs(head, mapping):
+    """Rewrite "N 0 R" references in an object head, leaving strings alone."""
+    def sub(segment):
+        return PDF_REF_RE.sub(lambda m: b"%d 0 R" % mapping.get(int(m.group(1)), int(m.group(1))), segment)
+
+    if b"(" not in head:
+        return sub(head)
+    out = []
+    start = i = 0
+    while True:
+        i = head.find(b"(", i)
+        if i == -1:
+            out.append(sub(head[start:]))
+            return b"".join(out)
+        end = _string_end(head, i)
+        out.append(sub(head[start:i]))
+        out.append(head[i:end])
+        start = i = end
+
+
+def _recompress(head, stream):
+    if b"/Filter" not in head:
+        packed = zlib.compress(stream, 9)
+        if len(packed) >= len(stream):
+            return head, stream
+        head = head.replace(b"<<", b"<<\n/Filter /FlateDecode", 1)
+    elif b"/Filter /FlateDecode" in head and b"/DecodeParms" not in head and b"[" not in head.split(b"/Filter", 1)[1][:3]:
+        try:
+            packed = zlib.compress(zlib.decompress(stream), 9)
+        except zlib.error:
+            return head, stream
+        if len(packed) >= len(stream):
+            return head, stream
+    else:
+        return head, stream
+    return PDF_LENGTH_RE.sub(b"/Length %d" % len(packed), head, count=1), packed
+
+
+def _merge_identical(objects, trailer, select=None):
+    """Merge identical objects (those whose head select() accepts) until
+    nothing changes: merging font files makes their descriptors identical,
+    then their fonts, and so on. Returns (objects, trailer)."""
+    while True:
+        seen = {}
+        mapping = {}
+        for number in sorted(objects):
+            if select is not None and not select(objects[number][0]):
+                continue
+            keep = seen.setdefault(objects[number], number)
+            if keep != number:
+                mapping[number] = keep
+        if not mapping:
+            return objects, trailer
+        objects = {n: (_map_refs(head, mapping), stream)
+                   for n, (head, stream) in objects.items() if n not in mapping}
+        trailer = _map_refs(trailer, mapping)
+
+
+def optimize_pdf(data):
+    """Return a smaller equivalent of fpdf2 output data."""
+    header, objects, trailer = read_pdf(data)
+    objects = {n: (head, stream) if stream is None else _recompress(head, stream)
+               for n, (head, stream) in objects.items()}
+    objects, trailer = _merge_identical(objects, trailer)
+
+    renumber = {old: new for new, old in enumerate(sorted(objects), 1)}
+    objects = {renumber[n]: (_map_refs(head, renumber), stream) for n, (head, stream) in objects.items()}
+    return write_pdf(header, objects, _map_refs(trailer, renumber))
+
+
+def pdf_size_breakdown(data):
+    """{object kind: [count, bytes]} for a PDF written by fpdf2 or
+    optimize_pdf; "xref" is the header, cross-reference table and trailer."""
+    header, objects, trailer = read_pdf(data)
+    roles = {}
+    for head, _ in objects.values():
+        for m in PDF_ROLE_RE.finditer(head):
+            roles[int(m.group(2))] = PDF_ROLES[m.group(1)]
+    sizes = {}
+    total = 0
+    for number, (head, stream) in objects.items():
+        kind = roles.get(number)
+        if kind is None:
+            # fpdf2 sorts keys, so an object's own /Type comes after any
+            # nested dictionaries (a page's inline link annotations)
+            types = PDF_TYPE_RE.findall(head)
+            if types:
+                kind = PDF_TYPES.get(types[-1], types[-1].decode().lower())
+            elif b"/Title" in head:
+                kind = "outline"
+            elif b"/CreationDate" in head or b"/Producer" in head:
+                kind = "info"
+            else:
+                kind = "other"
+        size = len(_serialize_object(number, head, stream))
+        entry = sizes.setdefault(kind, [0, 0])
+        entry[0] += 1
+        entry[1] += size
+        total += size
+    sizes["xref"] = [1, len(data) - total]
+    return sizes
+
+
+def format_size_breakdown(before, after):
+    """Table of two pdf_size_breakdown() results: the raw fpdf2 output of a
+    build and the optimize_pdf() result written to disk."""
+    lines = [f"  {'object':<16}{'count':>7}{'raw':>10}{'optimized':>10}{'saved':>8}"]
+    for kind in sorted(before, key=lambda k: -before[k][1]):
+        count, size = before[kind]
+        new_count, new_size = after.get(kind, (0, 0))
+        saved = (1 - new_size / size) * 100 if size else 0
+        lines.append(
+            f"    {kind:<14}{f'{count}>{new_count}' if new_count != count else count:>7}"
+            f"{size / 1024:>8.1f}KB{new_size / 1024:>8.1f}KB{saved:>7.1f}%"
+        )
+    total_before = sum(size for _, size in before.values())
+    total_after = sum(size for _, size in after.values())
+    lines.append(
+        f"  {total_before / 1024:.1f} KB -> {total_after / 1024:.1f} KB"
+        f" ({(1 - total_after / total_before) * 100:.1f}% smaller)"
+    )
+    return "\n".join(lines)
+
+
+class RenderProfile:
+    """Wall time and call counts for the phases of one build_pdf run.
+
+    Phases are parse, font load and output; blocks are the build_pdf dispatch
+    keyed by block type. Parse time is measured inside the block iterator, so
+    it stays separate from rendering even when the parser is streaming.
+    """
 
-    pdf.output(output_path)
+    def __init__(self):
+        self.phases = {}
+        self.blocks = {}
+        self.pages = 0
+        self.width_cache = (0, 0)
+        self.font_runs = {}
+        self.sizes = None
+        self.total = 0.0
+
+    @staticmethod
+    def add(table, name, seconds):
+        entry = table.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def timed_blocks(self, blocks):
+        it = iter(blocks)
+        while True:
+            start = time.perf_counter()
+            try:
+                block = next(it)
+            except StopIteration:
+                self.add(self.phases, "parse", time.perf_counter() - start)
+                return
+            self.add(self.phases, "parse", time.perf_counter() - start)
+            yield block
+
+    def to_dict(self):
+        def rows(table):
+            return {
+                name: {"calls": calls, "seconds": round(seconds, 6)}
+                for name, (calls, seconds) in sorted(table.items(), key=lambda kv: -kv[1][1])
+            }
+
+        return {
+            "total_seconds": round(self.total, 6),
+            "pages": self.pages,
+            "pages_per_second": round(self.pages / self.total, 2) if self.total else None,
+            "width_cache": {"hits": self.width_cache[0], "misses": self.width_cache[1]},
+            "font_runs": dict(sorted(self.font_runs.items())),
+            "sizes": self.sizes and {"before": self.sizes[0], "after": self.sizes[1]},
+            "phases": rows(self.phases),
+            "blocks": rows(self.blocks),
+        }
+
+    def format_table(self):
+        report = self.to_dict()
+        lines = [f"  {'':<14}{'calls':>8}{'seconds':>10}{'share':>8}"]
+        for title in ("phases", "blocks"):
+            lines.append(f"  {title}")
+            for name, row in report[title].items():
+                share = row["seconds"] / self.total * 100 if self.total else 0
+                lines.append(
+                    f"    {name:<12}{row['calls']:>8}{row['seconds']:>10.3f}{share:>7.1f}%"
+                )
+        hits, misses = self.width_cache
+        lines.append(
+            f"  {self.pages} pages in {self.total:.3f}s"
+            f" ({report['pages_per_second'] or 0:.1f} pages/s),"
+            f" width cache {hits} hits / {misses} misses"
+        )
+        lines.append("  font runs: " + ", ".join(
+            f"{family} {count}" for family, count in report["font_runs"].items()))
+        return "\n".join(lines)
+
+
+def build_pdf(blocks, output_path, profile=None, toc=False, optimize=False, page_index=None,
+              base_dir=None):
+    """Render blocks to output_path. blocks may be any iterable, including
+    the generator returned by stream_markdown. Pass a RenderProfile to
+    collect timings, and with optimize the before/after size breakdown.
+    Pass a list as page_index to have it filled with, for each page, the
+    number of the block that was being rendered when the page began.
+    Image paths are resolved against base_dir, the markdown file's
+    directory (default: the working directory).
+
+    Headings always become PDF bookmarks. With toc, a contents page is
+    reserved before the first h2 and filled in from those same bookmarks
+    when the PDF is written, so the document is still laid out only once;
+    the blocks are materialized first to size the reservation.
+    """
+    start = time.perf_counter()
+    pdf = FrameworkPDF(optimize, base_dir=base_dir)
+    setup = time.perf_counter() - start
+    if profile is not None:
+        blocks = profile.timed_blocks(blocks)
+    if toc:
+        blocks = list(blocks)
+        toc_entries = sum(HEADING_LEVELS.get(btype, 99) <= TOC_MAX_LEVEL for btype, _ in blocks)
+    pdf.add_page()
+
+    for n, (btype, data) in enumerate(blocks):
+        block_start = time.perf_counter()
+        font_load = pdf.font_load_seconds
+
+        if toc and btype == "h2":
+            pdf.reserve_toc(toc_entries)
+            toc = False
+
+        pdf.render_block(btype, data)
+
+        if page_index is not None:
+            page_index.extend([n] * (pdf.page_no() - len(page_index)))
+        if profile is not None:
+            # The TTF is registered inside the first block that needs it;
+            # that time is reported as font load, not against the block
+            font_load = pdf.font_load_seconds - font_load
+            profile.add(profile.blocks, btype, time.perf_counter() - block_start - font_load)
+
+    if profile is not None:
+        profile.add(profile.phases, "font load", setup + pdf.font_load_seconds)
+    output_start = time.perf_counter()
+    if not optimize:
+        pdf.output(output_path)
+    else:
+        data = bytes(pdf.output())
+        if profile is not None:
+            profile.add(profile.phases, "output", time.perf_counter() - output_start)
+            output_start = time.perf_counter()
+        optimized = optimize_pdf(data)
+        if hasattr(output_path, "write"):
+            output_path.write(optimized)
+        else:
+            with open(output_path, "wb") as f:
+                f.write(optimized)
+        if profile is not None:
+            profile.sizes = (pdf_size_breakdown(data), pdf_size_breakdown(optimized))
+    if profile is not None:
+        profile.add(profile.phases, "optimize" if optimize else "output",
+                    time.perf_counter() - output_start)
+        profile.pages = pdf.pages_count
+        profile.width_cache = (pdf.width_cache_hits, pdf.width_cache_misses)
+        profile.font_runs = dict(pdf.font_runs)
+        profile.total = time.perf_counter() - start
     return output_path
 
 
+def plan_pages(blocks, page_index=None, base_dir=None):
+    """Lay blocks out in a layout-only FrameworkPDF.
+
+    Returns (pdf, starts): the pdf has the page count and outline of the
+    real render, and starts maps each block a piece of a parallel render
+    can begin with to the state it begins in. That is any block whose
+    first ink lands on a new page, so the piece before it ends on the
+    block's starting page and the piece after it opens with a copy of that
+    page, which it leaves blank and which is dropped when they are merged.
+    """
+    pdf = FrameworkPDF(layout_only=True, base_dir=base_dir)
+    pdf.add_page()
+    starts = {}
+    for n, (btype, data) in enumerate(blocks):
+        page, ink = pdf.page_no(), pdf.ink
+        state = (page, pdf.get_x(), pdf.get_y(), pdf._first_title, pdf.table_state())
+        pdf.render_block(btype, data)
+        if pdf.page_no() > page and pdf.page_ink[page - 1] == ink:
+            starts[n] = state
+        if page_index is not None:
+            page_index.extend([n] * (pdf.page_no() - len(page_index)))
+    return pdf, starts
+
+
+def _render_piece(blocks, start, total_pages, optimize=False, base_dir=None):
+    """Render one piece of a parallel render. Runs inside a worker process.
+
+    start is the state plan_pages() recorded for the piece's first block,
+    or None for the piece that opens the document. Returns (pdf bytes,
+    (last page, x, y), clean): the position the next piece should start
+    from, and whether the page the piece opens with really stayed blank.
+    """
+    pdf = FrameworkPDF(optimize, base_dir=base_dir)
+    pdf.total_pages = total_pages
+    if start is not None:
+        page, x, y, pdf._first_title, table = start
+        pdf.page_offset = page - 1
+    pdf.add_page()
+    if start is not None:
+        pdf.set_xy(x, y)
+        if table is not None:
+            pdf.restore_table_state(table)
+    ink = pdf.ink
+    for btype, data in blocks:
+        pdf.render_block(btype, data)
+    end = (pdf.page_no() + pdf.page_offset, pdf.get_x(), pdf.get_y())
+    data = bytes(pdf.output())
+    clean = start is None or pdf.page_ink[0] == ink
+    return data, end, clean
+
+
+def split_pieces(starts, total_pages, pieces):
+    """Pick up to pieces - 1 blocks from starts to cut the document at,
+    each as close as it gets to an even share of the pages."""
+    cuts = []
+    candidates = sorted(starts)
+    for k in range(1, pieces):
+        target = total_pages * k / pieces
+        after = [n for n in candidates if not cuts or n > cuts[-1]]
+        if not after:
+            break
+        best = min(after, key=lambda n: abs(starts[n][0] + 1 - target))
+        if cuts and starts[best][0] == starts[cuts[-1]][0]:
+            continue
+        cuts.append(best)
+    return cuts
+
+
+def merge_pdfs(parts, outline):
+    """Join the pieces of a parallel render into one PDF.
+
+    Every piece after the first opens with a page the piece before it
+    finished, which is left out. The catalog and document info come from
+    the first piece and the bookmarks are rebuilt from outline, the
+    OutlineSections of the whole document; objects several pieces share
+    (images, their palettes, the document info) are kept once, and objects
+    nothing refers to any more (the other catalogs, page trees and
+    outlines) are dropped.
+    """
+    objects = {}
+    kids = []
+    offset = 0
+    for i, data in enumerate(parts):
+        header, part, trailer = read_pdf(data)
+        mapping = {n: n + offset for n in part}
+        catalog = int(re.search(rb"/Root (\d+) 0 R", trailer).group(1))
+        tree = int(re.search(rb"/Pages (\d+) 0 R", part[catalog][0]).group(1))
+        kids_array = re.search(rb"/Kids \[([^\]]*)\]", part[tree][0]).group(1)
+        part_kids = [int(n) for n in PDF_REF_RE.findall(kids_array)]
+        if i == 0:
+            first_header = header
+            root, pages = mapping[catalog], mapping[tree]
+            info = mapping[int(re.search(rb"/Info (\d+) 0 R", trailer).group(1))]
+        else:
+            part_kids = part_kids[1:]
+        objects.update((mapping[n], (_map_refs(head, mapping), stream))
+                       for n, (head, stream) in part.items())
+        kids += [mapping[n] for n in part_kids]
+        offset += max(part)
+    objects, _ = _merge_identical(objects, b"")
+
+    for n in kids:
+        head, stream = objects[n]
+        objects[n] = (re.sub(rb"/Parent \d+ 0 R", b"/Parent %d 0 R" % pages, head), stream)
+    head = objects[pages][0]
+    head = re.sub(rb"/Count \d+", b"/Count %d" % len(kids), head)
+    head = re.sub(rb"/Kids \[[^\]]*\]", b"/Kids [" + b" ".join(b"%d 0 R" % n for n in kids) + b"]",
+                  head)
+    objects[pages] = (head, None)
+
+    catalog = re.sub(rb"\n/Outlines \d+ 0 R", b"", objects[root][0])
+    if outline:
+        outline_objs = list(build_outline_objs(outline))
+        for obj in outline_objs:
+            offset += 1
+            obj.id = offset
+        for section in outline:
+            section.dest.page_ref = f"{kids[section.dest.page_number - 1]} 0 R"
+        for obj in outline_objs:
+            text = obj.serialize().encode("latin-1")
+            objects[obj.id] = (text[text.index(b"\n") + 1:text.rindex(b"\nendobj")], None)
+        catalog = catalog.replace(b"\n/Pages", b"\n/Outlines %d 0 R\n/Pages" % outline_objs[0].id)
+    objects[root] = (catalog, None)
+
+    live = set()
+    stack = [root, info]
+    while stack:
+        n = stack.pop()
+        if n not in live and n in objects:
+            live.add(n)
+            stack.extend(int(ref) for ref in PDF_REF_RE.findall(objects[n][0]))
+    renumber = {old: new for new, old in enumerate(sorted(live), 1)}
+    objects = {renumber[n]: (_map_refs(head, renumber), stream)
+               for n, (head, stream) in objects.items() if n in live}
+    digest = hashlib.md5()
+    for n in sorted(objects):
+        digest.update(_serialize_object(n, *objects[n]))
+    file_id = digest.hexdigest().upper().encode()
+    trailer = b"<<\n/Size %d\n/Root %d 0 R\n/Info %d 0 R\n/ID [<%s><%s>]\n>>" % (
+        len(objects) + 1, renumber[root], renumber[info], file_id, file_id)
+    return write_pdf(first_header, objects, trailer)
+
+
+def render_parallel(blocks, output_path, jobs=None, profile=None, optimize=False,
+                    page_index=None, base_dir=None):
+    """Render blocks to output_path like build_pdf(), split across worker
+    processes. Returns the number of pieces it was rendered in.
+
+    plan_pages() finds the page breaks without setting any text, the
+    document is cut at breaks that fall between blocks into up to jobs
+    pieces of PARALLEL_MIN_PAGES or more, and the pieces are rendered side
+    by side, numbering their pages out of the planned total, then merged.
+    Each piece reports where it ended; if that isn't where the next one was
+    planned to start, the document is rendered again in one piece, so the
+    result is always the one build_pdf() gives. Too short a document is
+    rendered in one piece to begin with.
+    """
+    blocks = list(blocks)
+    jobs = jobs or os.cpu_count() or 1
+    if jobs < 2:
+        build_pdf(blocks, output_path, profile, optimize=optimize, page_index=page_index,
+                  base_dir=base_dir)
+        return 1
+    planned_index = []
+    plan, starts = plan_pages(blocks, planned_index, base_dir)
+    total = plan.page_no()
+    cuts = split_pieces(starts, total, min(jobs, total // PARALLEL_MIN_PAGES))
+    if cuts:
+        bounds = list(zip([0] + cuts, cuts + [len(blocks)]))
+        with ProcessPoolExecutor(max_workers=len(bounds)) as pool:
+            futures = [
+                pool.submit(_render_piece, blocks[a:b], starts.get(a), total, optimize, base_dir)
+                for a, b in bounds
+            ]
+            results = [future.result() for future in futures]
+        # Every piece has to end exactly where the next one was planned to
+        # start, and the last one on the planned last page
+        exact = results[-1][1][0] == total and all(clean for _, _, clean in results)
+        for (_, (page, x, y), _), n in zip(results, cuts):
+            planned_page, planned_x, planned_y = starts[n][:3]
+            exact = exact and page == planned_page and math.isclose(x, planned_x, abs_tol=1e-6) \
+                and math.isclose(y, planned_y, abs_tol=1e-6)
+        if exact:
+            data = merge_pdfs([part for part, _, _ in results], plan._outline)
+            if optimize:
+                optimized = optimize_pdf(data)
+                if profile is not None:
+                    profile.sizes = (pdf_size_breakdown(data), pdf_size_breakdown(optimized))
+                data = optimized
+            with open(output_path, "wb") as f:
+                f.write(data)
+            if page_index is not None:
+                page_index.extend(planned_index)
+            return len(bounds)
+    build_pdf(blocks, output_path, profile, optimize=optimize, page_index=page_index,
+              base_dir=base_dir)
+    return 1
+
+
+_digests = {}
+
+
+def _file_digest(path):
+    """sha256 of a file, memoized per process (the font is ~20 MB)."""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    memo_key = (path, stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _digests:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        _digests[memo_key] = h.hexdigest()
+    return _digests[memo_key]
+
+
+def renderer_version():
+    fonts = "core" if USE_CORE_FONTS else "embed"
+    return f"{_file_digest(__file__)[:16]}-fpdf{fpdf.__version__}-{fonts}"
+
+
+def image_sources(input_path):
+    """The image files input_path refers to, resolved against its directory."""
+    base_dir = os.path.dirname(input_path)
+    with open(input_path) as f:
+        for line in f:
+            stripped = line.strip()
+            if stripped.startswith("!["):
+                block = _tok_image(stripped)
+                if block[0] == "image":
+                    yield os.path.join(base_dir, block[1][1])
+
+
+def build_key(input_path, toc=False, optimize=False):
+    """Cache key for one document: markdown + images + font + renderer
+    version + options."""
+    h = hashlib.sha256()
+    options = ("toc " if toc else "") + ("optimize " if optimize else "")
+    options += f"epoch={os.environ.get('SOURCE_DATE_EPOCH', '').strip()} images={IMAGE_DPI}dpi"
+    images = [_file_digest(path) if os.path.exists(path) else "missing"
+              for path in image_sources(input_path)]
+    for part in (_file_digest(input_path), *images, _file_digest(FONT_PATH), renderer_version(),
+                 options):
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _cache_entry(output_path, suffix=".key"):
+    rel = os.path.relpath(os.path.abspath(output_path), REPO_ROOT)
+    return os.path.join(CACHE_DIR, hashlib.sha1(rel.encode()).hexdigest() + suffix)
+
+
+def is_cached(key, output_path):
+    if not os.path.exists(output_path):
+        return False
+    try:
+        with open(_cache_entry(output_path)) as f:
+            return f.read().strip() == key
+    except OSError:
+        return False
+
+
+def store_key(key, output_path):
+    _store_cached(_cache_entry(output_path), key.encode())
+
+
+def store_page_index(output_path, page_index, key, toc=False, optimize=False):
+    """Save the page index of a full build, with its build key and the
+    options it was built with, so load_page_index() can tell when the
+    source has changed since."""
+    with _atomic_write(_cache_entry(output_path, ".pages"), "w") as f:
+        json.dump({"key": key, "toc": toc, "optimize": optimize, "pages": page_index}, f)
+
+
+def load_page_index(output_path, input_path):
+    """The page index of the last full build of input_path to output_path,
+    or None if there is none. Raises ValueError if input_path, an image or
+    the renderer changed after that build, as its pages no longer match."""
+    try:
+        with open(_cache_entry(output_path, ".pages")) as f:
+            entry = json.load(f)
+        key, toc, optimize, page_index = (entry[k] for k in ("key", "toc", "optimize", "pages"))
+    except (OSError, ValueError, TypeError, KeyError):
+        return None
+    if key != build_key(input_path, toc, optimize):
+        raise ValueError(f"{input_path} changed since {output_path} was built; "
+                         "build the whole document again first")
+    return page_index
+
+
+def convert_file(input_path, output_path, force=False, profile=False, use_ir=True, toc=False,
+                 optimize=False):
+    """Parse and render one markdown file. Runs inside a worker process.
+
+    Returns (input_path, output_path, cached, error, seconds, report); error
+    is None on success, so one broken document never takes down the rest of
+    the batch. report is a RenderProfile when profile or optimize is set
+    (its sizes hold the size breakdown), else None.
+    """
+    start = time.perf_counter()
+    cached = False
+    error = None
+    report = RenderProfile() if profile or optimize else None
+    try:
+        key = build_key(input_path, toc, optimize)
+        if not force and not profile and is_cached(key, output_path):
+            cached = True
+        else:
+            blocks = cached_blocks(input_path) if use_ir else stream_markdown(input_path)
+            page_index = []
+            build_pdf(blocks, output_path, report, toc, optimize, page_index,
+                      os.path.dirname(input_path))
+            store_key(key, output_path)
+            store_page_index(output_path, page_index, key, toc, optimize)
+    except Exception as exc:
+        error = f"{type(exc).__name__}: {exc}"
+    return input_path, output_path, cached, error, time.perf_counter() - start, report
+
+
+def check_reproducible(command, label, epoch):
+    """Run command + ["-o", <pdf>] twice, each in a fresh interpreter with a
+    different hash seed, and compare the sha256 of the two PDFs.
+    SOURCE_DATE_EPOCH is set to epoch unless already set. Prints both
+    digests and returns True when they match.
+    """
+    env = dict(os.environ)
+    env.setdefault("SOURCE_DATE_EPOCH", str(int(epoch)))
+    digests = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for seed in REPRODUCIBLE_SEEDS:
+            out = os.path.join(tmp, f"build-{seed}.pdf")
+            subprocess.run(
+                [*command, "-o", out], env=dict(env, PYTHONHASHSEED=seed),
+                stdout=subprocess.DEVNULL, check=True,
+            )
+            digests.append(_file_digest(out))
+    for seed, digest in zip(REPRODUCIBLE_SEEDS, digests):
+        print(f"  build {seed}  sha256 {digest}")
+    reproducible = len(set(digests)) == 1
+    print(f"{label}: {'reproducible' if reproducible else 'NOT reproducible'} "
+          f"(SOURCE_DATE_EPOCH={env['SOURCE_DATE_EPOCH']})")
+    return reproducible
+
+
+def collect_inputs(patterns):
+    """Expand files, directories and globs into a sorted list of markdown paths."""
+    found = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, "**", "*.md"), recursive=True)
+        elif glob.has_magic(pattern):
+            matches = glob.glob(pattern, recursive=True)
+        else:
+            matches = [pattern]
+        found.update(os.path.normpath(m) for m in matches if not os.path.isdir(m))
+    return sorted(found)
+
+
+def run_batch(inputs, jobs=None, force=False, profile=False, use_ir=True, toc=False,
+              optimize=False):
+    """Convert every input in parallel and print one status line per file.
+
+    Returns (number of files that failed, {input path: profile dict}).
+    """
+    start = time.perf_counter()
+    failures = skipped = 0
+    reports = {}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [
+            pool.submit(
+                convert_file, path, os.path.splitext(path)[0] + ".pdf", force, profile, use_ir, toc,
+                optimize,
+            )
+            for path in inputs
+        ]
+        for future in as_completed(futures):
+            src, out, cached, error, seconds, report = future.result()
+            if cached:
+                skipped += 1
+                print(f"  skip  {src} (unchanged)")
+            elif error is None:
+                size_kb = os.path.getsize(out) / 1024
+                print(f"  ok    {src} -> {out} ({size_kb:.0f} KB, {seconds:.2f}s)")
+                if report is not None and report.sizes is not None:
+                    print(format_size_breakdown(*report.sizes))
+                if profile:
+                    print(report.format_table())
+                    reports[src] = report.to_dict()
+            else:
+                failures += 1
+                print(f"  FAIL  {src}: {error}")
+
+    elapsed = time.perf_counter() - start
+    built = len(inputs) - failures - skipped
+    print(f"{built} built, {skipped} unchanged, {failures} failed in {elapsed:.2f}s")
+    return failures, reports
+
+
+def watch(patterns, use_ir=True, toc=False, optimize=False):
+    """Re-render documents whenever they change, in this one warm process.
+
+    Fonts, widths and fpdf2 stay loaded between renders. Changes are found by
+    polling mtimes (no extra dependencies), and a burst of saves is debounced
+    into a single render. Globs and directories are re-expanded on every poll,
+    so new files are picked up too.
+    """
+    def targets():
+        if not patterns:
+            return {INPUT: OUTPUT}
+        return {path: os.path.splitext(path)[0] + ".pdf" for path in collect_inputs(patterns)}
+
+    def snapshot(paths):
+        mtimes = {}
+        for path in paths:
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+
+    def render(pairs):
+        for src, out in pairs:
+            _, _, cached, error, seconds, _ = convert_file(src, out, use_ir=use_ir, toc=toc, optimize=optimize)
+            if error is not None:
+                print(f"  FAIL  {src}: {error}")
+            elif cached:
+                print(f"  skip  {src} (unchanged)")
+            else:
+                print(f"  ok    {src} -> {out} ({seconds * 1000:.0f} ms)")
+
+    outputs = targets()
+    render(outputs.items())
+    seen = snapshot(outputs)
+    print(f"Watching {len(outputs)} file(s) for changes (Ctrl-C to stop)")
+    try:
+        while True:
+            time.sleep(WATCH_INTERVAL)
+            outputs = targets()
+            current = snapshot(outputs)
+            if current == seen:
+                continue
+            while True:
+                time.sleep(WATCH_DEBOUNCE)
+                settled = snapshot(outputs)
+                if settled == current:
+                    break
+                current = settled
+            changed = [
+                (src, outputs[src]) for src, mtime in current.items()
+                if mtime is not None and mtime != seen.get(src)
+            ]
+            seen = current
+            render(changed)
+    except KeyboardInterrupt:
+        print()
+    return 0
+
+
+def write_profile_json(path, reports):
+    with open(path, "w") as f:
+        json.dump(reports, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"Profile written: {path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert markdown documents to PDF.")
+    parser.add_argument(
+        "paths", nargs="*",
+        help="markdown files, directories or globs (default: docs/the-framework.md)",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None,
+        help="worker processes for batch mode and --parallel (default: one per CPU)",
+    )
+    parser.add_argument(
+        "-f", "--force", action="store_true",
+        help="rebuild even if the build cache says the PDF is up to date",
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="time parse, font load, output and each block type (implies --force)",
+    )
+    parser.add_argument(
+        "--profile-json", metavar="PATH",
+        help="also write the profile as JSON to PATH (implies --profile)",
+    )
+    parser.add_argument(
+        "--no-ir-cache", dest="use_ir", action="store_false",
+        help="always parse the markdown instead of reusing the .<name>.ir block cache",
+    )
+    parser.add_argument(
+        "--toc", action="store_true",
+        help="add a contents page with page numbers before the first h2",
+    )
+    parser.add_argument(
+        "-O", "--optimize", action="store_true",
+        help="merge duplicate objects and recompress streams; prints a size breakdown",
+    )
+    parser.add_argument(
+        "-w", "--watch", action="store_true",
+        help="stay running and re-render whenever an input changes",
+    )
+    parser.add_argument(
+        "--section", action="append", default=[], metavar="HEADING",
+        help="render only the section under HEADING (exact, else substring; repeatable) "
+             "to <name>.proof.pdf",
+    )
+    parser.add_argument(
+        "--pages", type=parse_pages, metavar="N[-M]",
+        help="render only what was on pages N-M in the last full build, to <name>.proof.pdf",
+    )
+    parser.add_argument(
+        "-o", "--output", metavar="PATH",
+        help="write the PDF to PATH (single document; bypasses the build cache)",
+    )
+    parser.add_argument(
+        "--parallel", action="store_true",
+        help="split one long document into page ranges rendered by -j workers",
+    )
+    parser.add_argument(
+        "--html", action="store_true",
+        help="write a lightweight HTML preview, <name>.preview.html, instead of the PDF",
+    )
+    parser.add_argument(
+        "--check-reproducible", action="store_true",
+        help="build the document twice and check both PDFs are byte-identical",
+    )
+    args = parser.parse_args(argv)
+    profile = args.profile or bool(args.profile_json)
+    if args.parallel and (args.watch or len(args.paths) > 1 or args.toc or profile):
+        parser.error("--parallel takes a single document and can't be combined with "
+                     "--watch, --toc or --profile")
+
+    if args.section or args.pages:
+        if args.watch or len(args.paths) > 1:
+            parser.error("--section and --pages take a single document")
+        src = args.paths[0] if args.paths else INPUT
+        out = os.path.splitext(src)[0] + ".pdf" if args.paths else OUTPUT
+        start = time.perf_counter()
+        try:
+            proof, rendered, total = render_proof(src, out, args.section, args.pages, args.use_ir)
+        except ValueError as exc:
+            print(f"{src}: {exc}", file=sys.stderr)
+            return 1
+        print(f"Proof generated: {proof} ({rendered} of {total} blocks, "
+              f"{time.perf_counter() - start:.2f}s)")
+        return 0
+
+    if args.html:
+        if args.watch or args.section or args.pages or args.check_reproducible:
+            parser.error("--html can't be combined with --watch, --section, --pages "
+                         "or --check-reproducible")
+        inputs = collect_inputs(args.paths) if args.paths else [INPUT]
+        if args.output and len(inputs) > 1:
+            parser.error("--output takes a single document")
+        for src in inputs:
+            start = time.perf_counter()
+            out = args.output or preview_path(src)
+            blocks = cached_blocks(src) if args.use_ir else stream_markdown(src)
+            build_html(blocks, out, os.path.splitext(os.path.basename(src))[0])
+            print(f"  ok    {src} -> {out} ({(time.perf_counter() - start) * 1000:.1f} ms)")
+        return 0
+
+    if args.output or args.check_reproducible:
+        if args.watch or len(args.paths) > 1:
+            parser.error("--output and --check-reproducible take a single document")
+        src = args.paths[0] if args.paths else INPUT
+        if args.check_reproducible:
+            command = [sys.executable, os.path.abspath(__file__), src]
+            command += (["--toc"] if args.toc else []) + (["--optimize"] if args.optimize else [])
+            command += [] if args.use_ir else ["--no-ir-cache"]
+            command += ["--parallel"] if args.parallel else []
+            command += ["--jobs", str(args.jobs)] if args.jobs else []
+            return 0 if check_reproducible(command, src, os.path.getmtime(src)) else 1
+        report = RenderProfile() if profile or args.optimize else None
+        blocks = cached_blocks(src) if args.use_ir else stream_markdown(src)
+        try:
+            if args.parallel:
+                pieces = render_parallel(blocks, args.output, args.jobs, report, args.optimize,
+                                         base_dir=os.path.dirname(src))
+                print(f"PDF generated: {args.output} ({pieces} pieces)")
+            else:
+                out = build_pdf(blocks, args.output, report, args.toc, args.optimize,
+                                base_dir=os.path.dirname(src))
+                print(f"PDF generated: {out}")
+        except ValueError as exc:
+            print(f"{src}: {exc}", file=sys.stderr)
+            return 1
+        if args.optimize:
+            print(format_size_breakdown(*report.sizes))
+        if profile:
+            print(report.format_table())
+            if args.profile_json:
+                write_profile_json(args.profile_json, {src: report.to_dict()})
+        return 0
+
+    if args.watch:
+        return watch(args.paths, args.use_ir, args.toc, args.optimize)
+
+    if not args.paths or args.parallel:
+        src = args.paths[0] if args.paths else INPUT
+        out = os.path.splitext(src)[0] + ".pdf" if args.paths else OUTPUT
+        key = build_key(src, args.toc, args.optimize)
+        if not args.force and not profile and is_cached(key, out):
+            print(f"PDF up to date: {out}")
+            return 0
+        report = RenderProfile() if profile or args.optimize else None
+        blocks = cached_blocks(src) if args.use_ir else stream_markdown(src)
+        page_index = []
+        try:
+            if args.parallel:
+                start = time.perf_counter()
+                pieces = render_parallel(blocks, out, args.jobs, report, args.optimize,
+                                         page_index, os.path.dirname(src))
+            else:
+                build_pdf(blocks, out, report, args.toc, args.optimize, page_index,
+                          os.path.dirname(src))
+        except ValueError as exc:
+            print(f"{src}: {exc}", file=sys.stderr)
+            return 1
+        store_key(key, out)
+        store_page_index(out, page_index, key, args.toc, args.optimize)
+        size_kb = os.path.getsize(out) / 1024
+        print(f"PDF generated: {out}")
+        if args.parallel:
+            print(f"Rendered in {pieces} pieces in {time.perf_counter() - start:.2f}s")
+        print(f"Size: {size_kb:.0f} KB")
+        if args.optimize:
+            print(format_size_breakdown(*report.sizes))
+        if profile:
+            print(report.format_table())
+            if args.profile_json:
+                write_profile_json(args.profile_json, {src: report.to_dict()})
+        return 0
+
+    inputs = collect_inputs(args.paths)
+    if not inputs:
+        print("No markdown files matched.", file=sys.stderr)
+        return 1
+    failures, reports = run_batch(
+        inputs, args.jobs, args.force, profile, args.use_ir, args.toc, args.optimize,
+    )
+    if args.profile_json:
+        write_profile_json(args.profile_json, reports)
+    return 1 if failures else 0
+
+
 if __name__ == "__main__":
-    blocks = parse_markdown(INPUT)
-    out = build_pdf(blocks, OUTPUT)
-    size_kb = os.path.getsize(out) / 1024
-    print(f"PDF generated: {out}")
-    print(f"Size: {size_kb:.0f} KB")
+    sys.exit(main())
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""Local HTTP render service for md-to-pdf.py.
+
+Keeps a pool of worker processes with fpdf2 imported and the font metrics
+loaded, so a render costs only layout and output instead of interpreter
+startup, imports and font registration. Results are cached in memory by
+content hash with LRU eviction, and identical requests that arrive while a
+render is running share it.
+
+    python scripts/serve-md-to-pdf.py --port 8765 -j 4
+    curl --data-binary @docs/the-framework.md localhost:8765/render > out.pdf
+    curl localhost:8765/metrics
+
+    POST /render    markdown body -> application/pdf (?toc=1 adds a contents page)
+    POST /preview   markdown body -> text/html, rendered in the request thread
+    GET  /metrics   request latency, queue depth and cache stats as JSON
+    GET  /healthz   "ok"
+
+Images are off unless the service is started with --image-dir: then an
+![alt](path) line may name a file under that directory, by a relative path
+that stays inside it. Any other image line is a 400.
+"""
+
+import argparse
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+MD_TO_PDF = os.path.join(SCRIPTS_DIR, "md-to-pdf.py")
+
+MAX_BODY = 16 << 20      # largest markdown body accepted, in bytes
+LATENCY_WINDOW = 2048    # recent requests kept for the latency percentiles
+
+
+def load_md_to_pdf():
+    spec = importlib.util.spec_from_file_location("md_to_pdf", MD_TO_PDF)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# -- Worker processes --
+
+_md = None
+
+
+def _init_worker():
+    """Import md-to-pdf.py and parse the fallback font once per worker."""
+    global _md
+    _md = load_md_to_pdf()
+    _md.FrameworkPDF()._register_fallback()
+
+
+def _ping():
+    return os.getpid()
+
+
+def _render(markdown, toc, image_dir=None):
+    start = time.perf_counter()
+    out = io.BytesIO()
+    _md.build_pdf(_md.iter_blocks(io.StringIO(markdown)), out, toc=toc, base_dir=image_dir)
+    return out.getvalue(), time.perf_counter() - start
+
+
+# -- Service --
+
+def _percentiles(samples):
+    if not samples:
+        return {"p50_ms": None, "p90_ms": None, "p99_ms": None, "max_ms": None}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+    return {"p50_ms": pick(0.50), "p90_ms": pick(0.90), "p99_ms": pick(0.99),
+            "max_ms": round(ordered[-1] * 1000, 2)}
+
+
+class RenderService:
+    """Worker pool, result cache and metrics shared by every request thread."""
+
+    def __init__(self, md, jobs, cache_bytes, image_dir=None):
+        self.md = md
+        self.image_dir = os.path.realpath(image_dir) if image_dir else None
+        self.version = f"{md.renderer_version()}-{md._file_digest(md.FONT_PATH)[:16]}"
+        self.jobs = jobs
+        self.pool = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker)
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        self.cache_limit = cache_bytes
+        self.inflight = {}
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.hits = 0
+        self.misses = 0
+        self.joined = 0
+        self.evictions = 0
+        self.max_queue_depth = 0
+        self.request_times = deque(maxlen=LATENCY_WINDOW)
+        self.render_times = deque(maxlen=LATENCY_WINDOW)
+
+    def warm_up(self):
+        """Start every worker now, so no request pays for process start-up."""
+        for future in [self.pool.submit(_ping) for _ in range(self.jobs)]:
+            future.result()
+
+    def images(self, markdown):
+        """Digests of the images markdown embeds, in order.
+
+        Rendering reads these files and runs rsvg-convert or plantuml on
+        them, so each must be a relative path that resolves inside
+        image_dir; raises ValueError for any other.
+        """
+        if "![" not in markdown:
+            return []
+        digests = []
+        for btype, data in self.md.iter_blocks(io.StringIO(markdown)):
+            if btype != "image":
+                continue
+            path = data[1]
+            if self.image_dir is None:
+                raise ValueError(f"image {path!r}: images need the service started with --image-dir")
+            full = os.path.realpath(os.path.join(self.image_dir, path))
+            if (os.path.isabs(path) or ".." in path.replace("\\", "/").split("/")
+                    or os.path.commonpath([full, self.image_dir]) != self.image_dir):
+                raise ValueError(f"image {path!r}: must be a relative path inside --image-dir")
+            try:
+                digests.append(self.md._file_digest(full))
+            except OSError:
+                raise ValueError(f"image {path!r}: no such file in --image-dir") from None
+        return digests
+
+    def key(self, markdown, toc, images=()):
+        h = hashlib.sha256(self.version.encode())
+        h.update(b"\0toc\0" if toc else b"\0\0")
+        for digest in images:
+            h.update(f"{digest}\0".encode())
+        h.update(markdown.encode())
+        return h.hexdigest()
+
+    def render(self, markdown, toc=False):
+        """Return (pdf bytes, "hit" | "miss" | "joined").
+
+        Raises ValueError for an image the service won't read.
+        """
+        key = self.key(markdown, toc, self.images(markdown))
+        with self.lock:
+            pdf = self.cache.get(key)
+            if pdf is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return pdf, "hit"
+            future = self.inflight.get(key)
+            if future is not None:
+                self.joined += 1
+                status = "joined"
+            else:
+                self.misses += 1
+                status = "miss"
+                future = self.inflight[key] = self.pool.submit(
+                    _render, markdown, toc, self.image_dir)
+                self.max_queue_depth = max(self.max_queue_depth, self.queue_depth())
+        try:
+            pdf, seconds = future.result()
+        except Exception:
+            if status == "miss":
+                with self.lock:
+                    self.inflight.pop(key, None)
+            raise
+        if status == "miss":
+            # Cache before dropping the in-flight entry, so no request in
+            # between renders the same document again
+            with self.lock:
+                self.inflight.pop(key, None)
+                self.render_times.append(seconds)
+                self.store(key, pdf)
+        return pdf, status
+
+    def preview(self, markdown):
+        """HTML preview of markdown. It takes milliseconds, so it runs here
+        instead of queueing behind PDF renders, and isn't cached. Its image
+        paths are checked as for render()."""
+        self.images(markdown)
+        out = io.StringIO()
+        self.md.build_html(self.md.iter_blocks(io.StringIO(markdown)), out, "Preview")
+        return out.getvalue().encode()
+
+    def store(self, key, pdf):
+        if len(pdf) > self.cache_limit:
+            return
+        self.cache[key] = pdf
+        self.cache_bytes += len(pdf)
+        while self.cache_bytes > self.cache_limit:
+            _, evicted = self.cache.popitem(last=False)
+            self.cache_bytes -= len(evicted)
+            self.evictions += 1
+
+    def queue_depth(self):
+        """Renders waiting for a free worker (not counting the running ones)."""
+        return max(0, len(self.inflight) - self.jobs)
+
+    def record(self, seconds, ok):
+        with self.lock:
+            self.requests += 1
+            self.errors += not ok
+            self.request_times.append(seconds)
+
+    def metrics(self):
+        with self.lock:
+            return {
+                "uptime_seconds": round(time.time() - self.started, 1),
+                "workers": self.jobs,
+                "requests": self.requests,
+                "errors": self.errors,
+                "in_flight": len(self.inflight),
+                "queue_depth": self.queue_depth(),
+                "max_queue_depth": self.max_queue_depth,
+                "request_latency": _percentiles(self.request_times),
+                "render_latency": _percentiles(self.render_times),
+                "cache": {
+                    "entries": len(self.cache),
+                    "bytes": self.cache_bytes,
+                    "limit_bytes": self.cache_limit,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "joined": self.joined,
+                    "evictions": self.evictions,
+                },
+            }
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    server_version = "md-to-pdf"
+    service = None  # set by serve()
+    quiet = False
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/metrics":
+            self.reply(200, "application/json",
+                       json.dumps(self.service.metrics(), indent=2, sort_keys=True).encode() + b"\n")
+        elif path == "/healthz":
+            self.reply(200, "text/plain", b"ok\n")
+        else:
+            self.reply(404, "text/plain", b"not found\n")
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path not in ("/render", "/preview"):
+            self.reply(404, "text/plain", b"not found\n")
+            return
+        start = time.perf_counter()
+        ok = False
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            if not 0 < length <= MAX_BODY:
+                self.reply(413 if length else 400, "text/plain",
+                           f"expected a markdown body of 1 to {MAX_BODY} bytes\n".encode())
+                return
+            try:
+                markdown = self.rfile.read(length).decode("utf-8")
+            except UnicodeDecodeError:
+                self.reply(400, "text/plain", b"markdown must be UTF-8\n")
+                return
+            toc = parse_qs(url.query).get("toc", ["0"])[-1] not in ("", "0", "false")
+            try:
+                if url.path == "/preview":
+                    body = self.service.preview(markdown)
+                    content_type, headers = "text/html; charset=utf-8", {}
+                else:
+                    body, status = self.service.render(markdown, toc)
+                    content_type, headers = "application/pdf", {"X-Cache": status}
+            except ValueError as exc:
+                self.reply(400, "text/plain", f"{exc}\n".encode())
+                return
+            except Exception as exc:
+                self.reply(500, "text/plain", f"{type(exc).__name__}: {exc}\n".encode())
+                return
+            self.reply(200, content_type, body, headers)
+            ok = True
+        finally:
+            self.service.record(time.perf_counter() - start, ok)
+
+    def reply(self, code, content_type, body, headers=None):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+def serve(host, port, jobs, cache_mb, quiet=False, image_dir=None):
+    md = load_md_to_pdf()
+    service = RenderService(md, jobs, cache_mb << 20, image_dir)
+    service.warm_up()
+    RenderHandler.service = service
+    RenderHandler.quiet = quiet
+    server = ThreadingHTTPServer((host, port), RenderHandler)
+    server.daemon_threads = True
+    print(f"Serving md-to-pdf on http://{host}:{server.server_port} with {jobs} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print()
+    finally:
+        server.server_close()
+        service.pool.shutdown(cancel_futures=True)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve md-to-pdf.py renders over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="port to bind (default: 8765)")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=os.cpu_count() or 1,
+        help="warm worker processes (default: one per CPU)",
+    )
+    parser.add_argument(
+        "--cache-mb", type=int, default=256,
+        help="memory for cached PDFs, evicted least recently used first (default: 256)",
+    )
+    parser.add_argument(
+        "--image-dir",
+        help="directory ![alt](path) lines may embed images from (default: images are refused)",
+    )
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't log every request")
+    args = parser.parse_args(argv)
+    if args.image_dir and not os.path.isdir(args.image_dir):
+        parser.error(f"--image-dir {args.image_dir}: not a directory")
+    return serve(args.host, args.port, args.jobs, args.cache_mb, args.quiet, args.image_dir)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
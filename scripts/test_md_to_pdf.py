@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""Regression tests for md-to-pdf.py.
+
+    python -m unittest discover scripts
+"""
+
+import importlib.util
+import io
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stderr
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+MD_TO_PDF = os.path.join(SCRIPTS_DIR, "md-to-pdf.py")
+GENERATE_PR_DOCUMENT = os.path.join(SCRIPTS_DIR, "..", "docs", "pr-strategy",
+                                    "generate_pr_document.py")
+
+
+def load_md_to_pdf():
+    spec = importlib.util.spec_from_file_location("md_to_pdf", MD_TO_PDF)
+    module = importlib.util.module_from_spec(spec)
+    # Registered so worker processes can unpickle its functions
+    sys.modules["md_to_pdf"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_generate_pr_document():
+    spec = importlib.util.spec_from_file_location("generate_pr_document", GENERATE_PR_DOCUMENT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+md = load_md_to_pdf()
+
+ENDOBJ_HEADING = "Every object ends with endobj (and a stream\\)"
+
+
+def render(markdown, **kwargs):
+    out = io.BytesIO()
+    md.build_pdf(md.iter_blocks(io.StringIO(markdown)), out, **kwargs)
+    return out.getvalue()
+
+
+def titles(data):
+    """Bookmark titles, in object order."""
+    _, objects, _ = md.read_pdf(data)
+    found = []
+    for number in sorted(objects):
+        m = re.search(rb"/Title \((.*)\)", objects[number][0])
+        if m:
+            found.append(m.group(1))
+    return found
+
+
+class InlineSpansTest(unittest.TestCase):
+    def test_url_with_parentheses(self):
+        self.assertEqual(md.parse_spans("[x](https://example.com/a_(b)) after"),
+                         [("x", "", "https://example.com/a_(b)"), (" after", "", None)])
+
+
+class TableColumnsTest(unittest.TestCase):
+    def test_long_word_keeps_other_columns_whole(self):
+        pdf = md.FrameworkPDF()
+        pad = pdf._cell_pad()
+        widths = pdf._fit_columns(([12, 20, 400], [12, 20, 400], []), 160)
+        self.assertAlmostEqual(sum(widths), 160)
+        self.assertEqual(widths[:2], [12 + pad, 20 + pad])
+
+
+class ImageTest(unittest.TestCase):
+    def test_remote_image_stays_a_paragraph(self):
+        blocks = list(md.iter_blocks(io.StringIO("![ci](https://example.com/badge.svg)\n")))
+        self.assertEqual([btype for btype, _ in blocks], ["para"])
+
+    def test_missing_image_names_the_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with self.assertRaisesRegex(ValueError, "image not found: .*missing.png"):
+                render("# Title\n\n![gone](missing.png)\n", base_dir=tmp)
+
+
+class HtmlPreviewTest(unittest.TestCase):
+    def test_only_safe_links(self):
+        page = "".join(md.iter_html(md.iter_blocks(io.StringIO(
+            "[a](https://example.com) [b](javascript:alert(1)) [c](JaVaScript:x) "
+            "[d](#section) [e](mailto:x@example.com) [f](data:text/html,x)\n"))))
+        hrefs = re.findall(r'href="([^"]*)"', page)
+        self.assertEqual(hrefs, ["https://example.com", "#section", "mailto:x@example.com"])
+        self.assertNotIn("javascript", page.lower())
+
+    def test_preview_path(self):
+        self.assertEqual(md.preview_path("docs/roadmap.md"), "docs/roadmap.preview.html")
+
+
+class CoverageTest(unittest.TestCase):
+    def test_missing_glyphs_are_reported(self):
+        stderr = io.StringIO()
+        with redirect_stderr(stderr):
+            render("# Title\n\nArrow → and a private \U0010fffd character.\n")
+        self.assertIn("U+10FFFD", stderr.getvalue())
+        self.assertNotIn("U+2192", stderr.getvalue())
+
+    def test_pr_document_keeps_windows_1252(self):
+        pr = load_generate_pr_document()
+        content = {"header": "Café — “quoted”", "blocks": [{"op": "body", "text": "Naïve…"}]}
+        plan = pr.compile_plan(content)
+        self.assertEqual(plan["header"], "Café — “quoted”")
+        pdf = pr.SolaPDF()
+        pdf.set_compression(False)
+        pdf.add_page()
+        pdf.body(plan["header"])
+        self.assertIn(b"Caf\xe9 \x97 \x93quoted\x94", bytes(pdf.output()))
+        content["blocks"][0]["text"] = "An arrow →"
+        with self.assertRaisesRegex(ValueError, r"block 0 \(body\) text: .*U\+2192"):
+            pr.compile_plan(content)
+
+
+class ReadPdfTest(unittest.TestCase):
+    markdown = f"# Title\n\n## {ENDOBJ_HEADING}\n\nSome text.\n\n## After\n\nMore text.\n"
+
+    def test_endobj_in_a_string(self):
+        data = render(self.markdown)
+        _, objects, _ = md.read_pdf(data)
+        size = int(re.search(rb"/Size (\d+)", data).group(1))
+        self.assertEqual(len(objects), size - 1)
+        self.assertEqual(len(titles(data)), 3)
+
+    def test_optimize_keeps_the_outline(self):
+        data = render(self.markdown, optimize=True)
+        self.assertEqual(titles(data), titles(render(self.markdown)))
+        self.assertIn(b"endobj \\(and a stream", data)
+
+
+class ParallelTest(unittest.TestCase):
+    def test_merge_keeps_the_outline(self):
+        sections = [f"## Section {n}\n\n" + "Words in a paragraph. " * 400 + "\n\n"
+                    for n in range(60)]
+        markdown = f"# Title\n\n## {ENDOBJ_HEADING}\n\n" + "".join(sections)
+        blocks = list(md.iter_blocks(io.StringIO(markdown)))
+        with tempfile.TemporaryDirectory() as tmp:
+            serial = os.path.join(tmp, "serial.pdf")
+            parallel = os.path.join(tmp, "parallel.pdf")
+            md.build_pdf(blocks, serial)
+            pieces = md.render_parallel(blocks, parallel, jobs=2)
+            with open(serial, "rb") as f, open(parallel, "rb") as g:
+                serial_titles, parallel_titles = titles(f.read()), titles(g.read())
+        self.assertEqual(pieces, 2)
+        self.assertEqual(sorted(parallel_titles), sorted(serial_titles))
+
+
+class ReproducibleTest(unittest.TestCase):
+    """Each build runs in a fresh interpreter with its own hash seed, so set
+    and dict ordering can't hide behind one process's seed."""
+
+    markdown = ("# Title\n\n## Arrows → and ≥ from the fallback font\n\n"
+                "Text with a [link](https://example.com) and `code`.\n\n"
+                "| A | B |\n|---|---|\n| one | two → three |\n")
+
+    def digests(self, command, tmp):
+        env = dict(os.environ, SOURCE_DATE_EPOCH="1767225600")
+        digests = []
+        for seed in md.REPRODUCIBLE_SEEDS:
+            out = os.path.join(tmp, f"build-{seed}.pdf")
+            subprocess.run([sys.executable, *command, "-o", out],
+                           env=dict(env, PYTHONHASHSEED=seed),
+                           stdout=subprocess.DEVNULL, check=True)
+            with open(out, "rb") as f:
+                data = f.read()
+            self.assertIn(b"/CreationDate (D:20260101000000Z", data)
+            digests.append(md._file_digest(out))
+        return digests
+
+    def test_framework_pdf(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "doc.md")
+            with open(src, "w", encoding="utf-8") as f:
+                f.write(self.markdown)
+            first, second = self.digests([MD_TO_PDF, src], tmp)
+        self.assertEqual(first, second)
+
+    def test_sola_pdf(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            first, second = self.digests([GENERATE_PR_DOCUMENT], tmp)
+        self.assertEqual(first, second)
+
+
+if __name__ == "__main__":
+    unittest.main()